@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, Request
 #from routers.agent import chat
 from services.chat_service import handle_chat
@@ -8,8 +9,10 @@ import json
 router = APIRouter(prefix="/api/canvas")
 
 @router.get("/list")
-async def list_canvases():
-    return await db_service.list_canvases()
+async def list_canvases(after_updated_at: Optional[str] = None, after_id: Optional[str] = None):
+    # Pass the updated_at and id of the last canvas to fetch the next page
+    after = (after_updated_at, after_id) if after_updated_at and after_id else None
+    return await db_service.list_canvases(after=after)
 
 @router.post("/create")
 async def create_canvas(request: Request):
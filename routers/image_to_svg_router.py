@@ -7,7 +7,7 @@ import logging
 import base64
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from services.image_to_svg_converter import convert_image_to_svg_stages_7_8_9
+from services.image_to_svg_converter import convert_image_to_svg_stages_7_8_9_async
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +45,7 @@ async def convert_image_to_svg_simple(request: ImageToSvgRequest):
             raise HTTPException(status_code=400, detail="Invalid base64 image data")
         
         # Convert using InfoUI stages 7-9
-        result = convert_image_to_svg_stages_7_8_9(image_data)
+        result = await convert_image_to_svg_stages_7_8_9_async(image_data)
         
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Conversion failed'))
@@ -9,7 +9,7 @@ from services.db_service import db_service
 from utils.http_client import HttpClient
 # services
 from models.config_model import ModelInfo
-from typing import List
+from typing import List, Optional
 from services.tool_service import TOOL_MAPPING
 
 router = APIRouter(prefix="/api")
@@ -131,8 +131,10 @@ async def list_tools() -> list[ToolInfoJson]:
 
 
 @router.get("/list_chat_sessions")
-async def list_chat_sessions():
-    return await db_service.list_sessions()
+async def list_chat_sessions(after_updated_at: Optional[str] = None, after_id: Optional[str] = None):
+    # Pass the updated_at and id of the last session to fetch the next page
+    after = (after_updated_at, after_id) if after_updated_at and after_id else None
+    return await db_service.list_sessions(after=after)
 
 
 @router.get("/chat_session/{session_id}")
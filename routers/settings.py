@@ -8,6 +8,7 @@ import json
 import os
 import shutil
 import httpx
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
 from services.db_service import db_service
 from services.settings_service import settings_service
@@ -524,8 +525,10 @@ async def create_workflow(request: CreateWorkflowRequest):
 
 
 @router.get("/comfyui/list_workflows")
-async def list_workflows():
-    return await db_service.list_comfy_workflows()
+async def list_workflows(after_updated_at: Optional[str] = None, after_id: Optional[int] = None):
+    # 传入上一页最后一个工作流的 updated_at 和 id 获取下一页
+    after = (after_updated_at, after_id) if after_updated_at and after_id is not None else None
+    return await db_service.list_comfy_workflows(after=after)
 
 
 @router.delete("/comfyui/delete_workflow/{id}")
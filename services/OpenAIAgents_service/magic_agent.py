@@ -1,7 +1,7 @@
 # services/OpenAIAgents_service/magic_agent.py
 
 from services.config_service import config_service
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Awaitable, Optional
 from agents import Agent, Runner, set_tracing_disabled, set_default_openai_key, ImageGenerationTool,TResponseInputItem
 import asyncio
 import re
@@ -11,7 +11,38 @@ from tools.utils.image_canvas_utils import save_image_to_canvas
 from tools.utils.image_utils import get_image_info_and_save
 from services.config_service import FILES_DIR
 
-async def create_magic_response(messages: List[Dict[str, Any]], session_id: str = "", canvas_id: str = "") -> Dict[str, Any]:
+async def create_magic_response(
+    messages: List[Dict[str, Any]],
+    session_id: str = "",
+    canvas_id: str = "",
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """生成魔法回复，on_delta 用于增量推送面向用户的进度文本
+
+    意图分析只是给绘图智能体的指导，不推送给用户；
+    推送过的文本与最终回复拼接后一起返回，保证保存的内容与推送的一致。
+    """
+    streamed: List[str] = []
+
+    async def reply(text: str) -> Dict[str, Any]:
+        # 最终状态文本同样推送，回复内容 = 已推送的进度文本 + 最终状态
+        if on_delta is not None:
+            await on_delta(text)
+        return {
+            'role': 'assistant',
+            'content': [
+                {
+                    'type': 'text',
+                    'text': ''.join(streamed) + text
+                },
+            ]
+        }
+
+    async def progress(text: str) -> None:
+        streamed.append(text)
+        if on_delta is not None:
+            await on_delta(text)
+
     try:
         # 获取图片内容
         user_message: Dict[str, Any] = messages[-1]
@@ -72,10 +103,12 @@ async def create_magic_response(messages: List[Dict[str, Any]], session_id: str
                 ],
             })
 
+            await progress('✨ Analyzing your sketch...\n')
             result_intent = await Runner.run(intent_agent, thread)
             print(result_intent.final_output)
             thread = result_intent.to_input_list()
             
+            await progress('✨ Generating image...\n')
             result_draw = await Runner.run(draw_agent, thread)
             print("result_draw 对象属性:")
             print(f"final_output: {result_draw.final_output}")
@@ -109,50 +142,18 @@ async def create_magic_response(messages: List[Dict[str, Any]], session_id: str
                             print(f"❌ 保存图片到画布失败: {e}")
                         break
 
-            return {
-                'role': 'assistant',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': '✨ Magic Success!!!'
-                    },
-                ]
-            }
+            return await reply('✨ Magic Success!!!')
         else:
-            return {
-                'role': 'assistant',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': '✨ not found input image'
-                    }
-                ]
-            }
+            return await reply('✨ not found input image')
             
     except (asyncio.TimeoutError, Exception) as e:
         # 检查是否是超时相关的错误
         error_msg = str(e).lower()
         if 'timeout' in error_msg or 'timed out' in error_msg:
-            return {
-                'role': 'assistant',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': '✨ time out'
-                    }
-                ]
-            }
+            return await reply('✨ time out')
         else:
             print(f"创建魔法回复时出错: {e}")
-            return {
-                'role': 'assistant',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': f'✨ Magic Generation Error: {str(e)}'
-                    }
-                ]
-            }
+            return await reply(f'✨ Magic Generation Error: {str(e)}')
 
 def extract_image_url_from_result(result_text: str) -> str:
     """从结果文本中提取图片URL"""
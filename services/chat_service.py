@@ -2,12 +2,11 @@
 
 # Import necessary modules
 import asyncio
-import json
 from typing import Dict, Any, List, Optional
 
 # Import service modules
 from models.tool_model import ToolInfoJson
-from services.db_service import db_service
+from services.db_service import db_service, encode_message
 from services.langgraph_service import langgraph_multi_agent
 from services.websocket_service import send_to_websocket
 from services.stream_service import add_stream_task, remove_stream_task
@@ -53,7 +52,9 @@ async def handle_chat(data: Dict[str, Any]) -> None:
         # TODO: Better way to determin when to create new chat session.
         await db_service.create_chat_session(session_id, text_model.get('model'), text_model.get('provider'), canvas_id, (prompt[:200] if isinstance(prompt, str) else ''))
 
-    await db_service.create_message(session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1])) if len(messages) > 0 else None
+    # Queue the user message instead of waiting for the write before generation starts
+    user_message_saved = await db_service.enqueue_messages(
+        session_id, [(messages[-1].get('role', 'user'), encode_message(messages[-1]))]) if len(messages) > 0 else None
 
     # Create and start langgraph_agent task for chat processing
     task = asyncio.create_task(langgraph_multi_agent(
@@ -69,7 +70,13 @@ async def handle_chat(data: Dict[str, Any]) -> None:
     finally:
         # Always remove the task from stream_tasks after completion/cancellation
         remove_stream_task(session_id)
+        if user_message_saved is not None:
+            try:
+                await user_message_saved
+            except Exception as e:
+                print(f"Error saving user message for session {session_id}: {e}")
         # Notify frontend WebSocket that chat processing is done
-        await send_to_websocket(session_id, {
+        # (shielded so a cancellation cannot drop the terminal event)
+        await asyncio.shield(send_to_websocket(session_id, {
             'type': 'done'
-        })
+        }))
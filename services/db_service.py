@@ -1,21 +1,73 @@
+import asyncio
 import sqlite3
 import json
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import aiosqlite
 from .config_service import USER_DATA_DIR
 from .migrations.manager import MigrationManager, CURRENT_VERSION
 from .supabase_service import supabase_service
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 load_dotenv()
 
 DB_PATH = os.path.join(USER_DATA_DIR, "localmanus.db")
 
+# Background chat message writer limits
+WRITE_QUEUE_MAXSIZE = 1024
+WRITE_BATCH_SIZE = 256
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serialize a chat message for the chat_messages.message column"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(message).decode()
+        except TypeError:
+            pass
+    return json.dumps(message, separators=(',', ':'))
+
+
+def decode_message(message: str) -> Dict[str, Any]:
+    """Parse a chat_messages.message value"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(message)
+    return json.loads(message)
+
+
+def _decode_messages(raw_messages) -> List[Dict[str, Any]]:
+    """Parse stored messages, skipping empty or malformed rows"""
+    messages = []
+    for raw in raw_messages:
+        if raw:
+            try:
+                messages.append(decode_message(raw))
+            except (ValueError, TypeError):
+                pass
+    return messages
+
+
+def _after_clause(after: Optional[Tuple[str, Any]]) -> Tuple[str, Tuple[Any, ...]]:
+    """SQL filter for rows past an (updated_at, id) cursor in updated_at DESC, id DESC order"""
+    if after is None:
+        return "", ()
+    updated_at, last_id = after
+    return "(updated_at < ? OR (updated_at = ? AND id < ?))", (updated_at, updated_at, last_id)
+
+
 class DatabaseService:
     def __init__(self):
         # Check if we should use Supabase
         self.use_supabase = os.getenv("USE_SUPABASE", "false").lower() == "true"
+
+        # Write-behind queue for chat messages, created lazily on the running loop
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
         
         if not self.use_supabase:
             # Initialize SQLite as before
@@ -31,6 +83,12 @@ class DatabaseService:
     def _init_db(self):
         """Initialize the database with the current schema"""
         with sqlite3.connect(self.db_path) as conn:
+            # WAL lets readers proceed while a write is in progress; the journal
+            # mode is stored in the database file, so existing databases that
+            # need no migration are switched over here too
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA wal_autocheckpoint=1000")
+
             # Create version table if it doesn't exist
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS db_version (
@@ -55,7 +113,7 @@ class DatabaseService:
     async def create_canvas(self, id: str, name: str):
         """Create a new canvas"""
         if self.use_supabase:
-            return supabase_service.create_canvas(id, name)
+            return await asyncio.to_thread(supabase_service.create_canvas, id, name, return_row=False)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
@@ -64,25 +122,28 @@ class DatabaseService:
                 """, (id, name))
                 await db.commit()
 
-    async def list_canvases(self) -> List[Dict[str, Any]]:
-        """Get all canvases"""
+    async def list_canvases(self, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Get all canvases; after=(updated_at, id) of the last row returns the next page"""
         if self.use_supabase:
-            return supabase_service.list_canvases()
+            return await asyncio.to_thread(supabase_service.list_canvases, after=after)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 db.row_factory = sqlite3.Row
-                cursor = await db.execute("""
+                where, params = _after_clause(after)
+                cursor = await db.execute(f"""
                     SELECT id, name, description, thumbnail, created_at, updated_at
                     FROM canvases
-                    ORDER BY updated_at DESC
-                """)
+                    {"WHERE " + where if where else ""}
+                    ORDER BY updated_at DESC, id DESC
+                """, params)
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
     async def create_chat_session(self, id: str, model: str, provider: str, canvas_id: str, title: Optional[str] = None):
         """Save a new chat session"""
         if self.use_supabase:
-            return supabase_service.create_chat_session(id, canvas_id, title, model, provider)
+            return await asyncio.to_thread(
+                supabase_service.create_chat_session, id, canvas_id, title, model, provider, return_row=False)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
@@ -94,7 +155,8 @@ class DatabaseService:
     async def create_message(self, session_id: str, role: str, message: str):
         """Save a chat message"""
         if self.use_supabase:
-            return supabase_service.create_chat_message(session_id, role, message)
+            return await asyncio.to_thread(
+                supabase_service.create_chat_message, session_id, role, message, return_row=False)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
@@ -103,62 +165,99 @@ class DatabaseService:
                 """, (session_id, role, message))
                 await db.commit()
 
+    async def create_messages_bulk(self, session_id: str, messages: List[Tuple[str, str]]):
+        """Save several chat messages in one transaction"""
+        await self._insert_message_rows([(session_id, role, message) for role, message in messages])
+
+    async def _insert_message_rows(self, rows: List[Tuple[str, str, str]]):
+        """Insert (session_id, role, message) rows in one transaction"""
+        if not rows:
+            return
+        if self.use_supabase:
+            # One POST for the whole batch, across sessions, in queue order
+            await asyncio.to_thread(supabase_service.create_chat_messages, rows, return_row=False)
+        else:
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.executemany("""
+                    INSERT INTO chat_messages (session_id, role, message)
+                    VALUES (?, ?, ?)
+                """, rows)
+                await db.commit()
+
+    async def enqueue_messages(self, session_id: str, messages: List[Tuple[str, str]]) -> asyncio.Future:
+        """Queue chat messages for the background writer
+
+        Returns a future that resolves once the messages are committed. Messages
+        are written in the order they were queued; the queue is bounded so
+        producers wait when the writer falls behind.
+        """
+        if self._write_queue is None:
+            self._write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_MAXSIZE)
+            self._writer_task = asyncio.create_task(self._db_writer_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((session_id, messages, future))
+        return future
+
+    async def _db_writer_loop(self):
+        """Drain the write queue, inserting up to WRITE_BATCH_SIZE queued entries per transaction"""
+        queue = self._write_queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            rows = [(session_id, role, message)
+                    for session_id, messages, _ in batch
+                    for role, message in messages]
+            try:
+                await self._insert_message_rows(rows)
+            except Exception as e:
+                print(f"Error writing {len(rows)} chat messages: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
     async def get_chat_history(self, session_id: str) -> List[Dict[str, Any]]:
         """Get chat history for a session"""
         if self.use_supabase:
-            messages_data = supabase_service.get_chat_messages(session_id)
-            messages = []
-            for row in messages_data:
-                if row.get('message'):
-                    try:
-                        msg = json.loads(row['message'])
-                        messages.append(msg)
-                    except:
-                        pass
-            return messages
+            messages_data = await asyncio.to_thread(
+                supabase_service.get_chat_messages, session_id, columns="message")
+            return _decode_messages(row.get('message') for row in messages_data)
         else:
             async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = sqlite3.Row
                 cursor = await db.execute("""
-                    SELECT role, message, id
+                    SELECT message
                     FROM chat_messages
                     WHERE session_id = ?
                     ORDER BY id ASC
                 """, (session_id,))
                 rows = await cursor.fetchall()
-                
-                messages = []
-                for row in rows:
-                    row_dict = dict(row)
-                    if row_dict['message']:
-                        try:
-                            msg = json.loads(row_dict['message'])
-                            messages.append(msg)
-                        except:
-                            pass
-                    
-                return messages
-
-    async def list_sessions(self, canvas_id: str) -> List[Dict[str, Any]]:
-        """List all chat sessions"""
+                return _decode_messages(row[0] for row in rows)
+
+    async def list_sessions(self, canvas_id: Optional[str] = None, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """List all chat sessions; after=(updated_at, id) of the last row returns the next page"""
         if self.use_supabase:
-            return supabase_service.list_chat_sessions(canvas_id=canvas_id)
+            return await asyncio.to_thread(supabase_service.list_chat_sessions, canvas_id=canvas_id, after=after)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 db.row_factory = sqlite3.Row
+                where, params = _after_clause(after)
+                conditions = [where] if where else []
                 if canvas_id:
-                    cursor = await db.execute("""
-                        SELECT id, title, model, provider, created_at, updated_at
-                        FROM chat_sessions
-                        WHERE canvas_id = ?
-                        ORDER BY updated_at DESC
-                    """, (canvas_id,))
-                else:
-                    cursor = await db.execute("""
-                        SELECT id, title, model, provider, created_at, updated_at
-                        FROM chat_sessions
-                        ORDER BY updated_at DESC
-                    """)
+                    conditions.insert(0, "canvas_id = ?")
+                    params = (canvas_id, *params)
+                cursor = await db.execute(f"""
+                    SELECT id, title, model, provider, created_at, updated_at
+                    FROM chat_sessions
+                    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                    ORDER BY updated_at DESC, id DESC
+                """, params)
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
@@ -174,7 +273,9 @@ class DatabaseService:
     async def save_canvas_data(self, id: str, data: str, thumbnail: str = None):
         """Save canvas data"""
         if self.use_supabase:
-            return supabase_service.update_canvas(id, data=json.loads(data) if isinstance(data, str) else data, thumbnail=thumbnail)
+            return await asyncio.to_thread(
+                supabase_service.update_canvas, id, return_row=False,
+                data=json.loads(data) if isinstance(data, str) else data, thumbnail=thumbnail)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
@@ -187,9 +288,11 @@ class DatabaseService:
     async def get_canvas_data(self, id: str) -> Optional[Dict[str, Any]]:
         """Get canvas data"""
         if self.use_supabase:
-            canvas = supabase_service.get_canvas(id)
+            # Fetch the canvas and its sessions concurrently
+            canvas, sessions = await asyncio.gather(
+                asyncio.to_thread(supabase_service.get_canvas, id, columns="data,name"),
+                self.list_sessions(id))
             if canvas:
-                sessions = await self.list_sessions(id)
                 return {
                     'data': canvas.get('data', {}),
                     'name': canvas.get('name', ''),
@@ -219,7 +322,7 @@ class DatabaseService:
     async def delete_canvas(self, id: str):
         """Delete canvas and related data"""
         if self.use_supabase:
-            return supabase_service.delete_canvas(id)
+            return await asyncio.to_thread(supabase_service.delete_canvas, id)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("DELETE FROM canvases WHERE id = ?", (id,))
@@ -228,7 +331,7 @@ class DatabaseService:
     async def rename_canvas(self, id: str, name: str):
         """Rename canvas"""
         if self.use_supabase:
-            return supabase_service.update_canvas(id, name=name)
+            return await asyncio.to_thread(supabase_service.update_canvas, id, return_row=False, name=name)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("UPDATE canvases SET name = ? WHERE id = ?", (name, id))
@@ -237,7 +340,9 @@ class DatabaseService:
     async def create_comfy_workflow(self, name: str, api_json: str, description: str, inputs: str, outputs: str = None):
         """Create a new comfy workflow"""
         if self.use_supabase:
-            return supabase_service.create_comfy_workflow(name, api_json, description, inputs, outputs)
+            return await asyncio.to_thread(
+                supabase_service.create_comfy_workflow, name, api_json, description, inputs, outputs,
+                return_row=False)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("""
@@ -246,21 +351,27 @@ class DatabaseService:
                 """, (name, api_json, description, inputs, outputs))
                 await db.commit()
 
-    async def list_comfy_workflows(self) -> List[Dict[str, Any]]:
-        """List all comfy workflows"""
+    async def list_comfy_workflows(self, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """List all comfy workflows; after=(updated_at, id) of the last row returns the next page"""
         if self.use_supabase:
-            return supabase_service.list_comfy_workflows()
+            return await asyncio.to_thread(supabase_service.list_comfy_workflows, after=after)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 db.row_factory = sqlite3.Row
-                cursor = await db.execute("SELECT id, name, description, api_json, inputs, outputs FROM comfy_workflows ORDER BY id DESC")
+                where, params = _after_clause(after)
+                cursor = await db.execute(f"""
+                    SELECT id, name, description, api_json, inputs, outputs, updated_at
+                    FROM comfy_workflows
+                    {"WHERE " + where if where else ""}
+                    ORDER BY updated_at DESC, id DESC
+                """, params)
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
     async def delete_comfy_workflow(self, id: int):
         """Delete a comfy workflow"""
         if self.use_supabase:
-            return supabase_service.delete_comfy_workflow(id)
+            return await asyncio.to_thread(supabase_service.delete_comfy_workflow, id)
         else:
             async with aiosqlite.connect(self.db_path) as db:
                 await db.execute("DELETE FROM comfy_workflows WHERE id = ?", (id,))
@@ -269,7 +380,7 @@ class DatabaseService:
     async def get_comfy_workflow(self, id: int):
         """Get comfy workflow dict"""
         if self.use_supabase:
-            workflow = supabase_service.get_comfy_workflow(id)
+            workflow = await asyncio.to_thread(supabase_service.get_comfy_workflow, id, columns="api_json")
             if workflow and workflow.get('api_json'):
                 try:
                     workflow_json = (
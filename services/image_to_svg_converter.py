@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 import os
 import requests
 import json
@@ -6,6 +6,7 @@ import logging
 from flask_cors import CORS
 import re
 import base64
+import shutil
 from io import BytesIO
 import cairosvg
 from PIL import Image
@@ -18,6 +19,13 @@ import asyncio
 import aiohttp
 from functools import lru_cache
 import hashlib
+import xxhash
+import threading
+import time
+import atexit
+import math
+from dataclasses import dataclass
+from collections import OrderedDict
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 import cv2
@@ -78,6 +86,20 @@ except ImportError as e:
     logger.warning(f"png_to_svg_converter not available: {e}")
     PNG_CONVERTER_AVAILABLE = False
 
+try:
+    import orjson  # Fast serializer for the large JSON responses
+    ORJSON_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"orjson not available, falling back to jsonify: {e}")
+    ORJSON_AVAILABLE = False
+
+try:
+    from lxml import etree  # libxml2-backed parser for the SVG combiners
+    LXML_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"lxml not available, SVG combination will use regex extraction: {e}")
+    LXML_AVAILABLE = False
+
 # Custom logging filter to suppress 404 errors for missing image files
 class ImageNotFoundFilter(logging.Filter):
     def filter(self, record):
@@ -156,11 +178,19 @@ FLUX_MODEL = "black-forest-labs/flux-kontext-dev"  # Added Replicate Flux model
 SVG_GENERATOR_MODEL = "gpt-4o-mini"
 CHAT_ASSISTANT_MODEL = "gpt-4o-mini"
 
+# Precompiled SVG patterns used by the combiners and post-processing
+_SVG_INNER = re.compile(r'<svg[^>]*>(.*?)</svg>', re.DOTALL | re.IGNORECASE)
+
 # Add parallel SVG processing imports
 from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 import numpy as np
 
+# Shared pool for the OCR/background/elements workers so concurrent requests
+# reuse threads instead of each spinning up its own executor
+_STAGE7_POOL = ThreadPoolExecutor(max_workers=max(4, os.cpu_count() or 4), thread_name_prefix='stage7')
+atexit.register(_STAGE7_POOL.shutdown)
+
 # VTracer and related features availability check
 try:
     # Test if vtracer is functional by checking its main function
@@ -638,22 +668,30 @@ def clean_svg_code_original(svg_code):
         logger.error(f"Error cleaning SVG: {str(error)}")
         return svg_code
 
+def allocate_session_file(prefix, extension, session_id=None):
+    """Pick a unique file name in the session subfolder of IMAGES_DIR, creating the folder
+
+    Returns (filename, filepath, session_folder, session_id); a new session ID is
+    generated when none is given.
+    """
+    # Generate unique filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    filename = f"{prefix}_{timestamp}_{unique_id}.{extension}"
+    
+    # Create session ID if not provided
+    if not session_id:
+        session_id = f"session_{timestamp}_{uuid.uuid4().hex[:8]}"
+    
+    # Create session subfolder in static/images/
+    session_folder = os.path.join(IMAGES_DIR, session_id)
+    os.makedirs(session_folder, exist_ok=True)
+    return filename, os.path.join(session_folder, filename), session_folder, session_id
+
 def save_image(image_data, prefix="img", format="PNG", session_id=None):
     """Save image data to subfolder with unique session ID"""
     try:
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"{prefix}_{timestamp}_{unique_id}.{format.lower()}"
-        
-        # Create session ID if not provided
-        if not session_id:
-            session_id = f"session_{timestamp}_{uuid.uuid4().hex[:8]}"
-        
-        # Create session subfolder in static/images/
-        session_folder = os.path.join(IMAGES_DIR, session_id)
-        os.makedirs(session_folder, exist_ok=True)
-        filepath = os.path.join(session_folder, filename)
+        filename, filepath, session_folder, session_id = allocate_session_file(prefix, format.lower(), session_id)
 
         # Convert base64 to image and save
         image_bytes = base64.b64decode(image_data)
@@ -668,22 +706,42 @@ def save_image(image_data, prefix="img", format="PNG", session_id=None):
         logger.error(f"Error saving image: {str(e)}")
         raise
 
-def save_svg(svg_code, prefix="svg", session_id=None):
-    """Save SVG code to subfolder with unique session ID"""
+def save_image_bytes(image_bytes, prefix="img", format="PNG", session_id=None):
+    """Save already-encoded image bytes to subfolder without a base64/PIL round-trip"""
     try:
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"{prefix}_{timestamp}_{unique_id}.svg"
+        filename, filepath, session_folder, session_id = allocate_session_file(prefix, format.lower(), session_id)
+
+        # Write the bytes as-is
+        with open(filepath, 'wb') as f:
+            f.write(image_bytes)
         
-        # Create session ID if not provided
-        if not session_id:
-            session_id = f"session_{timestamp}_{uuid.uuid4().hex[:8]}"
+        # Return relative path from IMAGES_DIR
+        relative_path = f"{session_id}/{filename}"
+        logger.info(f"✅ Image saved successfully: {filename} in {session_folder}")
+        return filename, relative_path, session_id
+    except Exception as e:
+        logger.error(f"Error saving image bytes: {str(e)}")
+        raise
+
+def save_image_file(source_path, prefix="img", format="PNG", session_id=None):
+    """Copy an existing image file into a session subfolder without reading it into memory"""
+    try:
+        filename, filepath, session_folder, session_id = allocate_session_file(prefix, format.lower(), session_id)
+
+        shutil.copyfile(source_path, filepath)
         
-        # Create session subfolder in static/images/
-        session_folder = os.path.join(IMAGES_DIR, session_id)
-        os.makedirs(session_folder, exist_ok=True)
-        filepath = os.path.join(session_folder, filename)
+        # Return relative path from IMAGES_DIR
+        relative_path = f"{session_id}/{filename}"
+        logger.info(f"✅ Image copied successfully: {filename} in {session_folder}")
+        return filename, relative_path, session_id
+    except Exception as e:
+        logger.error(f"Error copying image: {str(e)}")
+        raise
+
+def save_svg(svg_code, prefix="svg", session_id=None):
+    """Save SVG code to subfolder with unique session ID"""
+    try:
+        filename, filepath, session_folder, session_id = allocate_session_file(prefix, "svg", session_id)
 
         # Save SVG code to file
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -707,8 +765,8 @@ def convert_svg_to_png(svg_code):
         png_data = cairosvg.svg2png(bytestring=svg_code.encode('utf-8'))
         
         # Save PNG file in the same session as SVG
-        png_filename, png_relative_path, _ = save_image(
-            base64.b64encode(png_data).decode('utf-8'),
+        png_filename, png_relative_path, _ = save_image_bytes(
+            png_data,
             prefix="converted_svg",
             format="PNG",
             session_id=session_id
@@ -719,6 +777,12 @@ def convert_svg_to_png(svg_code):
         logger.error(f"Error in SVG to PNG conversion: {str(e)}")
         raise
 
+def json_response(payload, status=200):
+    """Serialize a response payload with orjson when available, otherwise jsonify"""
+    if ORJSON_AVAILABLE:
+        return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+    return jsonify(payload), status
+
 @app.route('/static/images/<path:filename>')
 def serve_image(filename):
     """Serve images from the images directory with subfolder support"""
@@ -1202,29 +1266,35 @@ def create_background_extraction_mask(image_path):
     
     return mask_path
 
-def process_clean_svg(image_data):
-    """Process text AND background removal and convert to clean SVG (elements only)"""
+def process_clean_svg(image_data, use_cache=True):
+    """Process text AND background removal and convert to clean SVG (elements only)
+
+    use_cache=False bypasses the text-removal cache so a rejected edit is not reused.
+    """
     if not VTRACER_AVAILABLE:
         raise NotImplementedError("VTracer not available - missing core dependency")
     
-    # Save the original image bytes to a temporary PNG file
+    # Temporary PNG path, only written when text removal is skipped
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     temp_input_path = f"temp_input_{timestamp}_{uuid.uuid4()}.png"
-    with open(temp_input_path, "wb") as f:
-        f.write(image_data)
+    # Per-request preprocessing output; the edited PNG may be a shared cache entry
+    temp_pre_path = f"temp_gradient_pre_{timestamp}_{uuid.uuid4()}.png"
 
     try:
-        # If remove_text_simple is available, use it for text removal
+        # If remove_text_simple is available, hand it the bytes directly
         if REMOVE_TEXT_AVAILABLE:
-            final_edited_path = remove_text_simple.remove_text(temp_input_path)
+            final_edited_path = remove_text_simple.remove_text_bytes(
+                image_data, os.path.splitext(temp_input_path)[0], use_cache=use_cache)
             logger.info("Text removed from image, proceeding with V-Tracer for element isolation...")
         else:
             # Skip text removal if not available
+            with open(temp_input_path, "wb") as f:
+                f.write(image_data)
             final_edited_path = temp_input_path
             logger.info("Text removal not available, proceeding with V-Tracer using original image...")
 
         # Preprocess for vtracer: use gradient-friendly preprocessing
-        pre_vtracer_path = preprocess_for_gradients(final_edited_path)
+        pre_vtracer_path = preprocess_for_gradients(final_edited_path, temp_pre_path)
 
         output_svg_path = os.path.join(IMAGES_DIR, f"elements_{timestamp}_{uuid.uuid4().hex[:8]}.svg")
         vtracer.convert_image_to_svg_py(
@@ -1239,7 +1309,7 @@ def process_clean_svg(image_data):
         return svg_code, os.path.basename(output_svg_path), final_edited_path
     finally:
         # Clean up temporary files
-        for temp_file in [temp_input_path]:
+        for temp_file in [temp_input_path, temp_pre_path]:
             if os.path.exists(temp_file):
                 os.remove(temp_file)
 
@@ -1266,7 +1336,7 @@ def preprocess_for_vtracer(input_path):
     Image.fromarray(img_np).save(pre_path)
     return pre_path
     
-def preprocess_for_gradients(input_path):
+def preprocess_for_gradients(input_path, output_path=None):
     """Minimal preprocessing specifically for gradient-rich images"""
     # Load image
     img = Image.open(input_path).convert('RGB')
@@ -1281,124 +1351,11 @@ def preprocess_for_gradients(input_path):
     img_np = cv2.GaussianBlur(img_np, (3, 3), 0.5)
     
     # Save preprocessed image
-    pre_path = input_path.replace('.png', '_gradient_pre.png')
+    pre_path = output_path or input_path.replace('.png', '_gradient_pre.png')
     Image.fromarray(img_np).save(pre_path)
     return pre_path
 
 
-
-def ai_combine_svgs(text_svg_code, elements_svg_code, background_image_url=None):
-    """OPTIMIZED AI-powered combination of text, elements SVGs and background image"""
-    logger.info("Using OPTIMIZED AI to combine 3-layer SVG...")
-    
-    # Simplified system prompt for faster processing
-    system_prompt = """You are an SVG combiner. Create a single SVG with 3 layers:
-1. Background: <image href="URL" x="0" y="0" width="1080" height="1080"/>
-2. Elements: Graphics from elements SVG
-3. Text: Text from text SVG
-
-Structure:
-<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
-  <g id="background-layer">[background]</g>
-  <g id="elements-layer">[elements]</g>
-  <g id="text-layer">[text]</g>
-</svg>
-
-Return ONLY the SVG code."""
-
-    # Truncate SVG codes for faster processing
-    max_svg_length = 15000
-    if len(text_svg_code) > max_svg_length:
-        text_svg_code = text_svg_code[:max_svg_length] + "</svg>"
-    if len(elements_svg_code) > max_svg_length:
-        elements_svg_code = elements_svg_code[:max_svg_length] + "</svg>"
-
-    user_prompt = f"""Combine these into a 3-layer SVG:
-
-TEXT SVG:
-{text_svg_code}
-
-ELEMENTS SVG:
-{elements_svg_code}
-
-Background URL: {background_image_url}
-
-Return the combined SVG."""
-
-    # Use optimized call with faster model
-    ai_response = optimized_openai_call(
-        system_prompt=system_prompt,
-        user_prompt=user_prompt,
-        model="gpt-4.1-mini",  # Faster model
-        max_tokens=32000,      # Reduced tokens
-        temperature=1      # More deterministic
-    )
-    
-    if ai_response:
-        logger.info("AI successfully combined 3-layer SVG - optimized version")
-        return ai_response
-    else:
-        logger.info("AI call failed, using fallback")
-        return simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_image_url)
-
-def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_image_url=None):
-    """Fallback simple combination method with improved error handling for 3 layers"""
-    try:
-        logger.info("Using fallback 3-layer SVG combination method")
-        
-        # Validate inputs
-        if not text_svg_code or not elements_svg_code:
-            logger.warning("Missing SVG input data for fallback")
-            return elements_svg_code if elements_svg_code else text_svg_code
-        
-        # Extract content from both SVGs
-        text_match = re.search(r'<svg[^>]*>(.*?)</svg>', text_svg_code, re.DOTALL | re.IGNORECASE)
-        elements_match = re.search(r'<svg[^>]*>(.*?)</svg>', elements_svg_code, re.DOTALL | re.IGNORECASE)
-        
-        if not text_match:
-            logger.warning("Could not extract text SVG content, using entire text SVG")
-            text_content = text_svg_code
-        else:
-            text_content = text_match.group(1).strip()
-            
-        if not elements_match:
-            logger.warning("Could not extract elements SVG content, using entire elements SVG")
-            elements_content = elements_svg_code
-        else:
-            elements_content = elements_match.group(1).strip()
-        
-        # Prepare background layer using the provided URL
-        background_layer = ""
-        if background_image_url:
-            background_layer = f'''<image href="{background_image_url}" x="0" y="0" width="1080" height="1080" preserveAspectRatio="xMidYMid slice"/>'''
-        
-        # Create combined SVG with 3-layer structure
-        combined_svg = f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
-  <defs>
-    <!-- Include any definitions from original SVGs -->
-  </defs>
-  <g id="background-layer">
-    {background_layer}
-  </g>
-  <g id="elements-layer" opacity="0.9">
-    {elements_content}
-  </g>
-  <g id="text-layer">
-    {text_content}
-  </g>
-</svg>'''
-        
-        logger.info("Fallback 3-layer SVG combination completed successfully")
-        return combined_svg
-        
-    except Exception as e:
-        logger.error(f"Error in fallback 3-layer SVG combination: {str(e)}")
-        logger.error(f"Text SVG preview: {text_svg_code[:100] if text_svg_code else 'None'}...")
-        logger.error(f"Elements SVG preview: {elements_svg_code[:100] if elements_svg_code else 'None'}...")
-        logger.error(f"Background URL: {background_image_url}")
-        # Return the elements SVG as the safest fallback
-        return elements_svg_code if elements_svg_code else text_svg_code
-
 @app.route('/api/generate-parallel-svg', methods=['POST'])
 def generate_parallel_svg():
     """Direct Parallel SVG Pipeline: Takes image input and runs triple parallel processing stages"""
@@ -1435,16 +1392,15 @@ def generate_parallel_svg():
 
         # Stage 1: Triple Parallel Processing
         logger.info('Stage 1: Triple Parallel Processing - Text SVG, Background Extraction, and Elements SVG')
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all three tasks
-            ocr_future = executor.submit(process_ocr_svg, image_data)
-            background_future = executor.submit(process_background_extraction, image_data)
-            elements_future = executor.submit(process_clean_svg, image_data)
-            
-            # Get results
-            text_svg_code, text_svg_path = ocr_future.result()
-            background_base64, background_filename, background_path, background_public_url = background_future.result()
-            elements_svg_code, elements_svg_path, edited_png_path = elements_future.result()
+        # Submit all three tasks
+        ocr_future = _STAGE7_POOL.submit(process_ocr_svg, image_data)
+        background_future = _STAGE7_POOL.submit(process_background_extraction, image_data)
+        elements_future = _STAGE7_POOL.submit(process_clean_svg, image_data)
+        
+        # Get results
+        text_svg_code, text_svg_path = ocr_future.result()
+        background_base64, background_filename, background_path, background_public_url = background_future.result()
+        elements_svg_code, elements_svg_path, edited_png_path = elements_future.result()
 
         # Session already created above
 
@@ -1465,10 +1421,7 @@ def generate_parallel_svg():
             _, elements_svg_relative_path, _ = save_svg(elements_svg_code, prefix="elements_svg", session_id=parallel_session_id)
             
             # Save elements PNG to unified storage
-            with open(edited_png_path, 'rb') as f:
-                edited_png_data = f.read()
-            edited_png_base64 = base64.b64encode(edited_png_data).decode('utf-8')
-            _, edited_png_relative_path, _ = save_image(edited_png_base64, prefix="elements_png", format="PNG", session_id=parallel_session_id)
+            _, edited_png_relative_path, _ = save_image_file(edited_png_path, prefix="elements_png", format="PNG", session_id=parallel_session_id)
 
         except Exception as e:
             logger.warning(f"Error saving files to unified storage: {e}")
@@ -1534,29 +1487,33 @@ def generate_parallel_svg():
         max_svg_fix_attempts = 2
         svg_fix_attempts = 0
         elements_svg_code_fixed = elements_svg_code
-        while svg_fix_attempts < max_svg_fix_attempts:
-            # Heuristic: If force_svg_fix is set, or SVG is too small/empty, or user wants retry
-            if force_svg_fix or len(elements_svg_code_fixed) < 500 or '<path' not in elements_svg_code_fixed:
-                logger.info(f"Attempting AI-based SVG correction (attempt {svg_fix_attempts+1})...")
-                elements_svg_code_fixed = ai_fix_svg_with_png(elements_svg_code_fixed, edited_png_public_url, user_input)
-                svg_fix_attempts += 1
-                # If SVG is now much larger and contains paths, break
-                if len(elements_svg_code_fixed) > 500 and '<path' in elements_svg_code_fixed:
-                    svg_fixed = True
-                    break
-            else:
+        # Heuristic: If force_svg_fix is set, or SVG is too small/empty, or user wants retry.
+        # Kept as a flag so the SVG is only re-scanned when a fix attempt changes it
+        needs_fix = force_svg_fix or svg_needs_fix(elements_svg_code_fixed)
+        while needs_fix and svg_fix_attempts < max_svg_fix_attempts:
+            logger.info(f"Attempting AI-based SVG correction (attempt {svg_fix_attempts+1})...")
+            updated_svg_code = ai_fix_svg_with_png(elements_svg_code_fixed, edited_png_public_url, user_input)
+            svg_fix_attempts += 1
+            unchanged = updated_svg_code == elements_svg_code_fixed
+            elements_svg_code_fixed = updated_svg_code
+            # If SVG is now much larger and contains paths, break
+            if not svg_needs_fix(elements_svg_code_fixed):
+                svg_fixed = True
+                needs_fix = False
+                break
+            # Unchanged output means the next attempt would send the identical request
+            if unchanged:
+                logger.warning("AI-based SVG correction returned the SVG unchanged, skipping remaining attempts")
                 break
         # If still not usable, try to regenerate from scratch (fallback)
-        if not svg_fixed and (force_svg_fix or len(elements_svg_code_fixed) < 500 or '<path' not in elements_svg_code_fixed):
+        if needs_fix:
             logger.warning("SVG still not usable after AI fix, regenerating elements SVG from scratch...")
-            # Regenerate using process_clean_svg again
-            elements_svg_code_fixed, elements_svg_path, edited_png_path = process_clean_svg(image_data)
+            # Regenerate using process_clean_svg again, bypassing the cached
+            # text-removal edit that produced the rejected SVG
+            elements_svg_code_fixed, elements_svg_path, edited_png_path = process_clean_svg(image_data, use_cache=False)
             # Save new SVG and PNG
             _, elements_svg_relative_path, _ = save_svg(elements_svg_code_fixed, prefix="elements_svg_regen", session_id=parallel_session_id)
-            with open(edited_png_path, 'rb') as f:
-                edited_png_data = f.read()
-            edited_png_base64 = base64.b64encode(edited_png_data).decode('utf-8')
-            _, edited_png_relative_path, _ = save_image(edited_png_base64, prefix="elements_png_regen", format="PNG", session_id=parallel_session_id)
+            _, edited_png_relative_path, _ = save_image_file(edited_png_path, prefix="elements_png_regen", format="PNG", session_id=parallel_session_id)
             elements_svg_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}")
             edited_png_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}")
         else:
@@ -1567,7 +1524,15 @@ def generate_parallel_svg():
         # Use elements_svg_code_fixed for all downstream steps
         elements_svg_code = elements_svg_code_fixed
 
-        return jsonify({
+        # Compute the per-file session paths once for the response payload
+        session_prefix = f"sessions/{parallel_session_id}/"
+        background_session_path = session_prefix + os.path.basename(background_relative_path)
+        edited_png_session_path = session_prefix + os.path.basename(edited_png_relative_path)
+        text_svg_session_path = session_prefix + os.path.basename(text_svg_relative_path)
+        elements_svg_session_path = session_prefix + os.path.basename(elements_svg_relative_path)
+        combined_svg_public_url = get_public_image_url(combined_svg_relative_path)
+
+        return json_response({
             'original_prompt': user_input,
             'input_image': {
                 'url': input_image_url,
@@ -1577,24 +1542,24 @@ def generate_parallel_svg():
             },
             'background': {
                 'base64': background_base64,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(background_relative_path)}",
+                'path': background_session_path,
                 'url': background_url,
                 'public_url': background_public_url
             },
             'elements_png': {
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}",
+                'path': edited_png_session_path,
                 'url': edited_png_url,
                 'public_url': edited_png_public_url
             },
             'text_svg': {
                 'code': text_svg_code,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}",
+                'path': text_svg_session_path,
                 'url': text_svg_url,
                 'public_url': text_svg_public_url
             },
             'elements_svg': {
                 'code': elements_svg_code,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}",
+                'path': elements_svg_session_path,
                 'url': elements_svg_url,
                 'public_url': elements_svg_public_url
             },
@@ -1602,7 +1567,7 @@ def generate_parallel_svg():
                 'code': combined_svg_code,
                 'path': combined_svg_relative_path,
                 'url': combined_svg_url,
-                'public_url': get_public_image_url(combined_svg_relative_path)
+                'public_url': combined_svg_public_url
             },
             'session_id': parallel_session_id,
             'stage': 3,
@@ -1611,7 +1576,8 @@ def generate_parallel_svg():
 
     except Exception as e:
         logger.error(f"Error in generate_parallel_svg: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, status=500)
+
 
 
 
@@ -1622,39 +1588,135 @@ def generate_parallel_svg():
 
 
 
+# In-memory LRU cache for OpenAI/OpenRouter responses
+_response_cache: "OrderedDict[str, str]" = OrderedDict()
+_CACHE_MAX = 1024
+_response_cache_lock = threading.Lock()
+
+# Only near-deterministic calls are cached so creative calls still vary
+CACHEABLE_MAX_TEMPERATURE = 0.3
+
+@lru_cache(maxsize=64)
+def _system_prompt_hash(system_prompt):
+    """Hash a system prompt once; most are module-level constants reused across calls"""
+    return generate_prompt_hash(system_prompt)
+
+def _cache_key(system_prompt, user_prompt, model, max_tokens, temperature):
+    """Build the in-memory cache key for a chat completion request"""
+    return generate_prompt_hash(f"{model}\0{temperature}\0{max_tokens}\0{_system_prompt_hash(system_prompt)}\0{user_prompt}")
+
+def _disk_cache_key(system_prompt, user_prompt, model, max_tokens, temperature):
+    """Build the on-disk cache key; SHA-256 keeps file names collision resistant"""
+    return hashlib.sha256(f"{model}\0{temperature}\0{max_tokens}\0{system_prompt}\0{user_prompt}".encode()).hexdigest()
+
+# Disk-backed layer so cached responses survive worker restarts
+LLM_CACHE_DIR = os.path.join(os.path.dirname(IMAGES_DIR), 'llm_cache')
+os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 3600))
+# Expired entries are swept on write at most this often (seconds)
+LLM_CACHE_PRUNE_INTERVAL = int(os.getenv('LLM_CACHE_PRUNE_INTERVAL', 600))
+_last_llm_cache_prune = 0.0
+
+def _remember_response(key, response):
+    """Insert into the in-memory LRU, evicting the oldest entry when full"""
+    with _response_cache_lock:
+        _response_cache[key] = response
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > _CACHE_MAX:
+            _response_cache.popitem(last=False)
+
+def get_cached_openai_response(key, cache_request):
+    """Return a cached response for the key from memory or disk, or None on a miss"""
+    with _response_cache_lock:
+        value = _response_cache.get(key)
+        if value:
+            _response_cache.move_to_end(key)
+            return value
+    
+    path = os.path.join(LLM_CACHE_DIR, _disk_cache_key(*cache_request) + '.json')
+    try:
+        if time.time() - os.path.getmtime(path) >= CACHE_TTL:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f).get('response')
+    except (OSError, ValueError):
+        return None
+    
+    if value:
+        _remember_response(key, value)
+    return value
+
+def store_cached_openai_response(key, cache_request, response):
+    """Store a response in memory and atomically on disk"""
+    _remember_response(key, response)
+    
+    path = os.path.join(LLM_CACHE_DIR, _disk_cache_key(*cache_request) + '.json')
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'response': response, 'ts': time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to persist LLM cache entry: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    # The TTL is only checked on read, so sweep expired entries periodically
+    # to keep the directory bounded
+    if time.time() - _last_llm_cache_prune >= LLM_CACHE_PRUNE_INTERVAL:
+        prune_llm_cache()
+
+def prune_llm_cache():
+    """Remove disk cache entries older than CACHE_TTL; runs at startup and periodically on write"""
+    global _last_llm_cache_prune
+    _last_llm_cache_prune = time.time()
+    cutoff = _last_llm_cache_prune - CACHE_TTL
+    removed = 0
+    with os.scandir(LLM_CACHE_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    logger.info(f"🧹 Pruned {removed} expired LLM cache entries")
+    return removed
 
-# Add caching for OpenAI responses
-@lru_cache(maxsize=100)
-def get_cached_openai_response(prompt_hash, model, system_prompt_hash):
-    """Cache OpenAI responses to avoid repeated API calls for similar requests"""
-    return None
+prune_llm_cache()
 
 def generate_prompt_hash(prompt):
     """Generate a hash for prompt caching"""
-    return hashlib.md5(prompt.encode()).hexdigest()
+    return xxhash.xxh3_64_hexdigest(prompt.encode())
 
 # Create a global session with connection pooling for OpenAI API calls
 def create_optimized_session():
     """Create a requests session with connection pooling and retry strategy"""
     session = requests.Session()
     
-    # Configure retry strategy
+    # Configure retry strategy: honour OpenAI's Retry-After on 429s and jitter
+    # the backoff so concurrent workers don't retry in lockstep
     retry_strategy = Retry(
-        total=2,  # Reduced retries for faster failure
+        total=3,
         status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"],
-        backoff_factor=0.3  # Reduced backoff for speed
+        allowed_methods=frozenset(["POST", "GET"]),
+        backoff_factor=1.0,
+        backoff_jitter=0.5,
+        respect_retry_after_header=True,
+        raise_on_status=False  # Hand the final error response back to the caller
     )
     
-    # Configure adapter with connection pooling
+    # Size the pool to the actual worker concurrency; idle extra sockets get closed server-side anyway
+    cpu_count = os.cpu_count() or 4
     adapter = HTTPAdapter(
-        pool_connections=10,
-        pool_maxsize=20,
+        pool_connections=cpu_count,
+        pool_maxsize=cpu_count * 2,
         max_retries=retry_strategy
     )
     
     session.mount("http://", adapter)
     session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip"})
     
     return session
 
@@ -1662,45 +1724,68 @@ def create_optimized_session():
 openai_session = create_optimized_session()
 
 # Performance monitoring for OpenAI API calls
-api_performance_stats = {
-    'total_calls': 0,
-    'total_time': 0,
-    'avg_response_time': 0,
-    'fastest_call': float('inf'),
-    'slowest_call': 0,
-    'success_rate': 0,
-    'failures': 0
-}
-
-def log_api_performance(response_time, success=True):
+@dataclass
+class ApiStats:
+    total_calls: int = 0
+    total_time: float = 0.0
+    fastest: float = math.inf
+    slowest: float = 0.0
+    failures: int = 0
+    cache_read_tokens: int = 0
+
+_stats = ApiStats()
+_stats_lock = threading.Lock()
+
+def log_api_performance(response_time, success=True, cache_read_tokens=0):
     """Log API performance metrics"""
-    global api_performance_stats
-    
-    api_performance_stats['total_calls'] += 1
-    if success:
-        api_performance_stats['total_time'] += response_time
-        api_performance_stats['fastest_call'] = min(api_performance_stats['fastest_call'], response_time)
-        api_performance_stats['slowest_call'] = max(api_performance_stats['slowest_call'], response_time)
-        api_performance_stats['avg_response_time'] = api_performance_stats['total_time'] / (api_performance_stats['total_calls'] - api_performance_stats['failures'])
-    else:
-        api_performance_stats['failures'] += 1
-    
-    api_performance_stats['success_rate'] = ((api_performance_stats['total_calls'] - api_performance_stats['failures']) / api_performance_stats['total_calls']) * 100
-    
-    if api_performance_stats['total_calls'] % 5 == 0:  # Log every 5 calls
-        logger.info(f"OpenAI API Performance Stats: Avg: {api_performance_stats['avg_response_time']:.2f}s, "
-                   f"Range: {api_performance_stats['fastest_call']:.2f}s-{api_performance_stats['slowest_call']:.2f}s, "
-                   f"Success Rate: {api_performance_stats['success_rate']:.1f}%")
+    with _stats_lock:
+        _stats.total_calls += 1
+        _stats.cache_read_tokens += cache_read_tokens
+        if success:
+            _stats.total_time += response_time
+            _stats.fastest = min(_stats.fastest, response_time)
+            _stats.slowest = max(_stats.slowest, response_time)
+        else:
+            _stats.failures += 1
+        
+        if _stats.total_calls % 5 == 0:  # Log every 5 calls
+            successes = _stats.total_calls - _stats.failures
+            avg_response_time = _stats.total_time / successes if successes else 0.0
+            success_rate = successes / _stats.total_calls * 100
+            logger.info(f"OpenAI API Performance Stats: Avg: {avg_response_time:.2f}s, "
+                       f"Range: {_stats.fastest:.2f}s-{_stats.slowest:.2f}s, "
+                       f"Success Rate: {success_rate:.1f}%, "
+                       f"Provider cache reads: {_stats.cache_read_tokens} tokens")
+
+# Stream chat completions so tokens are received while the model is still generating
+OPENAI_STREAM = os.getenv('OPENAI_STREAM') == '1'
+
+def read_streamed_completion(response, start_time):
+    """Accumulate the delta content of a server-sent-events chat completion stream"""
+    chunks = []
+    first_token_logged = False
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data: '):
+            continue
+        data = line[len('data: '):]
+        if data == '[DONE]':
+            break
+        choices = json.loads(data).get('choices')
+        if not choices:
+            continue
+        content = choices[0].get('delta', {}).get('content')
+        if content:
+            if not first_token_logged:
+                logger.info(f"OpenAI stream time-to-first-token: {time.time() - start_time:.2f}s")
+                first_token_logged = True
+            chunks.append(content)
+    return ''.join(chunks)
 
 # Optimized OpenAI API call with streaming and reduced payload
 def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_tokens=8000, temperature=0.3):
     """Optimized OpenAI API call with connection pooling, caching, and reduced payload"""
     import time
     
-    # Generate cache keys
-    prompt_hash = generate_prompt_hash(user_prompt)
-    system_hash = generate_prompt_hash(system_prompt)
-    
     logger.info(f"Making OPTIMIZED OpenAI call: {model}, tokens: {max_tokens}, prompt_size: {len(user_prompt)}")
     
     url = OPENAI_CHAT_ENDPOINT
@@ -1720,6 +1805,15 @@ def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_t
         logger.info(f"Truncating system prompt from {len(system_prompt)} to 8000 chars for faster processing")
         system_prompt = system_prompt[:8000] + "..."
 
+    cache_key = None
+    if temperature <= CACHEABLE_MAX_TEMPERATURE:
+        cache_request = (system_prompt, user_prompt, model, max_tokens, temperature)
+        cache_key = _cache_key(*cache_request)
+        cached_response = get_cached_openai_response(cache_key, cache_request)
+        if cached_response:
+            logger.info(f"[CACHE HIT] Returning cached {model} response")
+            return cached_response
+
     payload = {
         "model": model,
         "messages": [
@@ -1734,29 +1828,36 @@ def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_t
         ],
         "temperature": temperature,
         "max_tokens": max_tokens,
-        "stream": False
+        "stream": OPENAI_STREAM
     }
 
     start_time = time.time()
     try:
-        # Use the global session with connection pooling
-        response = openai_session.post(url, headers=headers, json=payload, timeout=80)
-        api_response_time = time.time() - start_time
+        # Use the global session with connection pooling; the context manager
+        # releases the pooled connection even when a stream stops at [DONE]
+        with openai_session.post(url, headers=headers, json=payload, timeout=80, stream=OPENAI_STREAM) as response:
+            api_response_time = time.time() - start_time
+
+            if response.status_code != 200:
+                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                log_api_performance(api_response_time, success=False)
+                return None
         
-        # Log performance
-        log_api_performance(api_response_time, success=True)
+            # Log performance
+            log_api_performance(api_response_time, success=True)
         
-        logger.info(f"[SUCCESS] OPTIMIZED OpenAI API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
+            logger.info(f"[SUCCESS] OPTIMIZED OpenAI API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
 
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-            log_api_performance(api_response_time, success=False)
-            return None
-
-        response_data = response.json()
-        ai_response = response_data["choices"][0]["message"]["content"]
+            if OPENAI_STREAM:
+                ai_response = read_streamed_completion(response, start_time).strip()
+                logger.info(f"OpenAI stream completed in {time.time() - start_time:.2f}s")
+            else:
+                response_data = response.json()
+                ai_response = response_data["choices"][0]["message"]["content"].strip()
+            if cache_key:
+                store_cached_openai_response(cache_key, cache_request, ai_response)
         
-        return ai_response.strip()
+        return ai_response
             
     except Exception as e:
         api_response_time = time.time() - start_time
@@ -1769,66 +1870,6 @@ def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_t
 
 
 
-def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_image_url=None):
-    """Fallback simple combination method with improved error handling for 3 layers"""
-    try:
-        logger.info("Using fallback 3-layer SVG combination method")
-        
-        # Validate inputs
-        if not text_svg_code or not elements_svg_code:
-            logger.warning("Missing SVG input data for fallback")
-            return elements_svg_code if elements_svg_code else text_svg_code
-        
-        # Extract content from both SVGs
-        text_match = re.search(r'<svg[^>]*>(.*?)</svg>', text_svg_code, re.DOTALL | re.IGNORECASE)
-        elements_match = re.search(r'<svg[^>]*>(.*?)</svg>', elements_svg_code, re.DOTALL | re.IGNORECASE)
-        
-        if not text_match:
-            logger.warning("Could not extract text SVG content, using entire text SVG")
-            text_content = text_svg_code
-        else:
-            text_content = text_match.group(1).strip()
-            
-        if not elements_match:
-            logger.warning("Could not extract elements SVG content, using entire elements SVG")
-            elements_content = elements_svg_code
-        else:
-            elements_content = elements_match.group(1).strip()
-        
-        # Prepare background layer using the provided URL
-        background_layer = ""
-        if background_image_url:
-            background_layer = f'''<image href="{background_image_url}" x="0" y="0" width="1080" height="1080" preserveAspectRatio="xMidYMid slice"/>'''
-        
-        # Create combined SVG with 3-layer structure
-        combined_svg = f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
-  <defs>
-    <!-- Include any definitions from original SVGs -->
-  </defs>
-  <g id="background-layer">
-    {background_layer}
-  </g>
-  <g id="elements-layer" opacity="0.9">
-    {elements_content}
-  </g>
-  <g id="text-layer">
-    {text_content}
-  </g>
-</svg>'''
-        
-        logger.info("Fallback 3-layer SVG combination completed successfully")
-        return combined_svg
-        
-    except Exception as e:
-        logger.error(f"Error in fallback 3-layer SVG combination: {str(e)}")
-        logger.error(f"Text SVG preview: {text_svg_code[:100] if text_svg_code else 'None'}...")
-        logger.error(f"Elements SVG preview: {elements_svg_code[:100] if elements_svg_code else 'None'}...")
-        logger.error(f"Background URL: {background_image_url}")
-        # Return the elements SVG as the safest fallback
-        return elements_svg_code if elements_svg_code else text_svg_code
-
-
-
 # Add OpenRouter configuration near the top with other API configurations
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 if not OPENROUTER_API_KEY:
@@ -1848,6 +1889,19 @@ if OPENROUTER_API_KEY:
         api_key=OPENROUTER_API_KEY,
     )
 
+# Models behind OpenRouter that take explicit cache_control breakpoints; OpenAI models cache automatically
+PROMPT_CACHE_MODEL_PREFIXES = ('anthropic/', 'google/gemini')
+
+def get_cache_read_tokens(usage):
+    """Extract provider-side prompt cache hits from a completion's usage block"""
+    if not usage:
+        return 0
+    cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None)
+    if cache_read_tokens is None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cache_read_tokens = getattr(details, 'cached_tokens', None) if details else None
+    return cache_read_tokens or 0
+
 def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2.5-flash", max_tokens=8000, temperature=0.3):
     """Optimized OpenRouter API call using Google Gemini-2.5-flash"""
     import time
@@ -1868,6 +1922,29 @@ def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2
         logger.info(f"Truncating system prompt from {len(system_prompt)} to 8000 chars for faster processing")
         system_prompt = system_prompt[:8000] + "..."
 
+    cache_key = None
+    if temperature <= CACHEABLE_MAX_TEMPERATURE:
+        cache_request = (system_prompt, user_prompt, model, max_tokens, temperature)
+        cache_key = _cache_key(*cache_request)
+        cached_response = get_cached_openai_response(cache_key, cache_request)
+        if cached_response:
+            logger.info(f"[CACHE HIT] Returning cached {model} response")
+            return cached_response
+
+    # Mark the system prompt as a cache breakpoint so the provider can reuse its KV cache
+    if model.startswith(PROMPT_CACHE_MODEL_PREFIXES):
+        system_message = {
+            "role": "system",
+            "content": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+            ]
+        }
+    else:
+        system_message = {
+            "role": "system",
+            "content": system_prompt
+        }
+
     start_time = time.time()
     try:
         completion = openrouter_client.chat.completions.create(
@@ -1878,10 +1955,7 @@ def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2
             extra_body={},
             model=model,
             messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
+                system_message,
                 {
                     "role": "user", 
                     "content": user_prompt
@@ -1894,12 +1968,17 @@ def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2
         api_response_time = time.time() - start_time
         
         # Log performance
-        log_api_performance(api_response_time, success=True)
+        cache_read_tokens = get_cache_read_tokens(completion.usage)
+        log_api_performance(api_response_time, success=True, cache_read_tokens=cache_read_tokens)
+        if cache_read_tokens:
+            logger.info(f"OpenRouter prompt cache hit: {cache_read_tokens} tokens read from cache")
         
         logger.info(f"[SUCCESS] OPTIMIZED OpenRouter API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
 
-        ai_response = completion.choices[0].message.content
-        return ai_response.strip()
+        ai_response = completion.choices[0].message.content.strip()
+        if cache_key:
+            store_cached_openai_response(cache_key, cache_request, ai_response)
+        return ai_response
             
     except Exception as e:
         api_response_time = time.time() - start_time
@@ -1907,6 +1986,34 @@ def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2
         logger.error(f"[ERROR] Error in optimized OpenRouter call after {api_response_time:.2f}s: {str(e)}")
         return None
 
+# Static fragments of the 3-layer SVG, joined around the layer contents
+_LAYERED_SVG_HEAD = '''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
+  <defs>
+    <!-- Include any definitions from original SVGs -->
+  </defs>
+  <g id="background-layer">
+    '''
+_LAYERED_SVG_ELEMENTS = '''
+  </g>
+  <g id="elements-layer" opacity="0.9">
+    '''
+_LAYERED_SVG_TEXT = '''
+  </g>
+  <g id="text-layer">
+    '''
+_LAYERED_SVG_TAIL = '''
+  </g>
+</svg>'''
+
+def build_layered_svg(background_layer, elements_content, text_content):
+    """Assemble the 3-layer SVG with a single join instead of f-string formatting"""
+    return ''.join((
+        _LAYERED_SVG_HEAD, background_layer,
+        _LAYERED_SVG_ELEMENTS, elements_content,
+        _LAYERED_SVG_TEXT, text_content,
+        _LAYERED_SVG_TAIL
+    ))
+
 def normal_combine_svgs(text_svg_code, elements_svg_code, background_image_url=None):
     """Normal function to combine SVGs in the specified structure without AI dependency"""
     try:
@@ -1922,16 +2029,15 @@ def normal_combine_svgs(text_svg_code, elements_svg_code, background_image_url=N
             """Extract the inner content of an SVG (between svg tags)"""
             if not svg_code:
                 return ""
+            # Already inner content: skip the regex scan over the whole string
+            if '<svg' not in svg_code and '<SVG' not in svg_code:
+                return svg_code.strip()
             try:
                 # Find content between <svg> and </svg> tags
-                start_match = re.search(r'<svg[^>]*>', svg_code, re.IGNORECASE | re.DOTALL)
-                end_match = re.search(r'</svg>', svg_code, re.IGNORECASE)
+                match = _SVG_INNER.search(svg_code)
                 
-                if start_match and end_match:
-                    start_pos = start_match.end()
-                    end_pos = end_match.start()
-                    content = svg_code[start_pos:end_pos].strip()
-                    return content
+                if match:
+                    return match.group(1).strip()
                 else:
                     # If no SVG tags found, return as-is (might be inner content already)
                     return svg_code.strip()
@@ -1949,20 +2055,7 @@ def normal_combine_svgs(text_svg_code, elements_svg_code, background_image_url=N
             background_layer = f'<image href="{background_image_url}" x="0" y="0" width="1080" height="1080" preserveAspectRatio="xMidYMid slice"/>'
         
         # Create the structured combined SVG following the exact format specified
-        combined_svg = f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
-  <defs>
-    <!-- Include any definitions from original SVGs -->
-  </defs>
-  <g id="background-layer">
-    {background_layer}
-  </g>
-  <g id="elements-layer" opacity="0.9">
-    {elements_content}
-  </g>
-  <g id="text-layer">
-    {text_content}
-  </g>
-</svg>'''
+        combined_svg = build_layered_svg(background_layer, elements_content, text_content)
         
         logger.info("✅ Successfully created structured 3-layer SVG combination")
         return combined_svg
@@ -1977,6 +2070,41 @@ def ai_combine_svgs(text_svg_code, elements_svg_code, background_image_url=None)
     logger.info("Using normal function to combine 3-layer SVG...")
     return normal_combine_svgs(text_svg_code, elements_svg_code, background_image_url)
 
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+
+if LXML_AVAILABLE:
+    # Don't resolve entities in model-generated SVG; allow large vtracer path dumps
+    _SVG_XML_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+def combine_svgs_with_lxml(text_svg_code, elements_svg_code, background_image_url=None):
+    """Combine SVGs into the 3-layer structure by parsing both inputs with lxml"""
+    text_root = etree.fromstring(text_svg_code.encode('utf-8'), _SVG_XML_PARSER)
+    elements_root = etree.fromstring(elements_svg_code.encode('utf-8'), _SVG_XML_PARSER)
+    
+    # Children of a non-SVG root would be re-parented under the wrong namespace
+    svg_tag = f"{{{SVG_NAMESPACE}}}svg"
+    if text_root.tag != svg_tag or elements_root.tag != svg_tag:
+        raise ValueError("Input is not a namespaced <svg> document")
+    
+    g_tag = f"{{{SVG_NAMESPACE}}}g"
+    combined = etree.Element(svg_tag, nsmap={None: SVG_NAMESPACE},
+                             viewBox="0 0 1080 1080", width="1080", height="1080")
+    etree.SubElement(combined, f"{{{SVG_NAMESPACE}}}defs")
+    
+    background_layer = etree.SubElement(combined, g_tag, id="background-layer")
+    if background_image_url:
+        etree.SubElement(background_layer, f"{{{SVG_NAMESPACE}}}image", href=background_image_url,
+                         x="0", y="0", width="1080", height="1080",
+                         preserveAspectRatio="xMidYMid slice")
+    
+    # Moving the children re-parents them without copying the subtrees
+    elements_layer = etree.SubElement(combined, g_tag, id="elements-layer", opacity="0.9")
+    elements_layer.extend(list(elements_root))
+    text_layer = etree.SubElement(combined, g_tag, id="text-layer")
+    text_layer.extend(list(text_root))
+    
+    return etree.tostring(combined, encoding='unicode', pretty_print=False)
+
 def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_image_url=None):
     """Fallback simple combination method with improved error handling for 3 layers"""
     try:
@@ -1987,9 +2115,18 @@ def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_im
             logger.warning("Missing SVG input data for fallback")
             return elements_svg_code if elements_svg_code else text_svg_code
         
+        # Fast path: libxml2 parses in linear time and handles nested <svg> tags correctly
+        if LXML_AVAILABLE:
+            try:
+                combined_svg = combine_svgs_with_lxml(text_svg_code, elements_svg_code, background_image_url)
+                logger.info("Fallback 3-layer SVG combination completed successfully (lxml)")
+                return combined_svg
+            except (etree.XMLSyntaxError, ValueError) as e:
+                logger.warning(f"lxml could not parse input SVGs, using regex extraction: {e}")
+        
         # Extract content from both SVGs
-        text_match = re.search(r'<svg[^>]*>(.*?)</svg>', text_svg_code, re.DOTALL | re.IGNORECASE)
-        elements_match = re.search(r'<svg[^>]*>(.*?)</svg>', elements_svg_code, re.DOTALL | re.IGNORECASE)
+        text_match = _SVG_INNER.search(text_svg_code)
+        elements_match = _SVG_INNER.search(elements_svg_code)
         
         if not text_match:
             logger.warning("Could not extract text SVG content, using entire text SVG")
@@ -2009,20 +2146,7 @@ def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_im
             background_layer = f'''<image href="{background_image_url}" x="0" y="0" width="1080" height="1080" preserveAspectRatio="xMidYMid slice"/>'''
         
         # Create combined SVG with 3-layer structure
-        combined_svg = f'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1080 1080" width="1080" height="1080">
-  <defs>
-    <!-- Include any definitions from original SVGs -->
-  </defs>
-  <g id="background-layer">
-    {background_layer}
-  </g>
-  <g id="elements-layer" opacity="0.9">
-    {elements_content}
-  </g>
-  <g id="text-layer">
-    {text_content}
-  </g>
-</svg>'''
+        combined_svg = build_layered_svg(background_layer, elements_content, text_content)
         
         logger.info("Fallback 3-layer SVG combination completed successfully")
         return combined_svg
@@ -2039,33 +2163,55 @@ def post_process_svg_remove_first_path(svg_code):
     """Normal post-processing to remove first path in elements-layer"""
     logger.info("Post-processing SVG to remove first path in elements-layer...")
     
-    # Use regex-based approach
+    # Locate the layer and its first path with plain string scans; the structure
+    # comes from normal_combine_svgs so no regex backtracking is needed
     try:
-        import re
+        # Find elements-layer group
+        layer_start = svg_code.find('<g id="elements-layer"')
+        if layer_start < 0:
+            logger.info("No elements-layer found, returning original SVG")
+            return svg_code
         
-        # Find elements-layer group and remove first path
-        pattern = r'(<g id="elements-layer"[^>]*>)(.*?)</g>'
-        match = re.search(pattern, svg_code, re.DOTALL)
+        layer_open_end = svg_code.find('>', layer_start)
+        layer_end = svg_code.find('</g>', layer_open_end)
+        if layer_open_end < 0 or layer_end < 0:
+            logger.info("Unterminated elements-layer, returning original SVG")
+            return svg_code
         
-        if match:
-            elements_content = match.group(2)
-            # Remove first path tag
-            path_pattern = r'<path[^>]*(?:/>|>.*?</path>)'
-            elements_content_modified = re.sub(path_pattern, '', elements_content, count=1)
-            
-            # Replace in original SVG
-            modified_svg = svg_code.replace(match.group(0), match.group(1) + elements_content_modified + '</g>')
-            logger.info("✅ Successfully removed first path using regex")
-            return modified_svg
-        else:
-            logger.info("No elements-layer found, returning original SVG")
+        # Find the first path tag inside the layer
+        path_start = svg_code.find('<path', layer_open_end, layer_end)
+        if path_start < 0:
+            logger.info("No path in elements-layer, returning original SVG")
+            return svg_code
+        
+        tag_end = svg_code.find('>', path_start, layer_end)
+        if tag_end < 0:
+            logger.info("Unterminated path in elements-layer, returning original SVG")
             return svg_code
         
+        if svg_code[tag_end - 1] == '/':
+            # Self-closing <path ... />
+            path_end = tag_end + 1
+        else:
+            close_start = svg_code.find('</path>', tag_end, layer_end)
+            if close_start < 0:
+                logger.info("Unterminated path in elements-layer, returning original SVG")
+                return svg_code
+            path_end = close_start + len('</path>')
+        
+        modified_svg = svg_code[:path_start] + svg_code[path_end:]
+        logger.info("✅ Successfully removed first path from elements-layer")
+        return modified_svg
+        
     except Exception as e:
-        logger.warning(f"Regex approach failed: {str(e)}, returning original SVG")
+        logger.warning(f"Path removal failed: {str(e)}, returning original SVG")
         return svg_code
 
 def convert_image_to_svg_stages_7_8_9(image_data: bytes):
+    """Synchronous wrapper around convert_image_to_svg_stages_7_8_9_async for callers without an event loop"""
+    return asyncio.run(convert_image_to_svg_stages_7_8_9_async(image_data))
+
+async def convert_image_to_svg_stages_7_8_9_async(image_data: bytes):
     """
     Convert image data to SVG using InfoUI Stages 7-9 parallel processing
     All files are saved in the same session subfolder
@@ -2095,40 +2241,47 @@ def convert_image_to_svg_stages_7_8_9(image_data: bytes):
         
         # Stage 7: Triple Parallel Processing
         logger.info('Stage 7: Triple Parallel Processing - Text SVG, Background Extraction, and Elements SVG')
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all three tasks with shared session ID
-            ocr_future = executor.submit(process_ocr_svg_with_session, image_data, shared_session_id)
-            background_future = executor.submit(process_background_extraction_with_session, image_data, shared_session_id)
-            elements_future = executor.submit(process_clean_svg_with_session, image_data, shared_session_id)
-            
-            # Get results
-            text_svg_code, text_svg_path = ocr_future.result()
-            background_base64, background_filename, background_path, background_public_url = background_future.result()
-            elements_svg_code, elements_svg_path, edited_png_path = elements_future.result()
+        loop = asyncio.get_running_loop()
+        ocr_result, background_result, elements_result = await asyncio.gather(
+            loop.run_in_executor(_STAGE7_POOL, process_ocr_svg_with_session, image_data, shared_session_id),
+            loop.run_in_executor(_STAGE7_POOL, process_background_extraction_with_session, image_data, shared_session_id),
+            loop.run_in_executor(_STAGE7_POOL, process_clean_svg_with_session, image_data, shared_session_id)
+        )
+        
+        # Get results
+        text_svg_code, text_svg_path = ocr_result
+        background_base64, background_filename, background_path, background_public_url = background_result
+        elements_svg_code, elements_svg_path, edited_png_path = elements_result
         
         # Stage 8: Normal 3-Layer SVG Combination  
         logger.info('Stage 8: Normal 3-Layer SVG Combination using structured approach')
-        combined_svg_code = ai_combine_svgs_with_session(text_svg_code, elements_svg_code, background_public_url, shared_session_id)
+        combined_svg_code = normal_combine_svgs(text_svg_code, elements_svg_code, background_public_url)
         
-        # Validate the combined SVG
-        if not combined_svg_code or not combined_svg_code.strip():
+        # Validate the combined SVG; normal_combine_svgs returns either the full
+        # template or "" (no inputs), never whitespace, so truthiness is enough
+        if not combined_svg_code:
             logger.error("Combined SVG is empty, using fallback")
             combined_svg_code = simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_public_url)
         
+        # Save the combined SVG in the background while Stage 9 runs
+        combined_save_task = asyncio.create_task(asyncio.to_thread(save_svg, combined_svg_code, prefix="combined_svg", session_id=shared_session_id))
+        
         # Stage 9: Post-process SVG
         logger.info('Stage 9: Post-processing SVG to remove first path in elements-layer')
-        combined_svg_code = post_process_svg_remove_first_path_with_session(combined_svg_code, shared_session_id)
+        combined_svg_code = post_process_svg_remove_first_path(combined_svg_code)
+        final_save_task = asyncio.create_task(asyncio.to_thread(save_svg, combined_svg_code, prefix="final_svg", session_id=shared_session_id))
+        await asyncio.gather(combined_save_task, final_save_task)
         
         logger.info("=== InfoUI STAGES 7-8-9 CONVERSION COMPLETE ===")
         logger.info(f"🗂️  All files saved in session: {shared_session_id}")
         
-        # List all files that were saved to the session
-        session_folder = os.path.join(IMAGES_DIR, shared_session_id)
-        if os.path.exists(session_folder):
-            files = os.listdir(session_folder)
-            logger.info(f"📁 Session folder contains {len(files)} files:")
-            for file in files:
-                logger.info(f"   📄 {file}")
+        # List all files that were saved to the session (debug only)
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                files = os.listdir(os.path.join(IMAGES_DIR, shared_session_id))
+                logger.debug("📁 Session %s contains %d files: %s", shared_session_id, len(files), files)
+            except FileNotFoundError:
+                pass
         
         return {
             'success': True,
@@ -2172,10 +2325,7 @@ def process_clean_svg_with_session(image_data, session_id):
     # Also save the edited PNG file to the shared session
     if edited_png_path and os.path.exists(edited_png_path):
         try:
-            with open(edited_png_path, 'rb') as f:
-                edited_png_data = f.read()
-            edited_png_base64 = base64.b64encode(edited_png_data).decode('utf-8')
-            save_image(edited_png_base64, prefix="edited_png", session_id=session_id)
+            save_image_file(edited_png_path, prefix="edited_png", session_id=session_id)
             logger.info(f"✅ Edited PNG saved to shared session: {session_id}")
         except Exception as e:
             logger.warning(f"Failed to save edited PNG to shared session: {e}")
@@ -2196,6 +2346,10 @@ def post_process_svg_remove_first_path_with_session(svg_code, session_id):
     save_svg(processed_svg, prefix="final_svg", session_id=session_id)
     return processed_svg
 
+def svg_needs_fix(svg_code):
+    """Heuristic for an unusable elements SVG: too small to hold real content, or no paths at all"""
+    return len(svg_code) < 500 or '<path' not in svg_code
+
 def ai_fix_svg_with_png(elements_svg_code, elements_png_url, prompt=None):
     """Use an AI model to fix the SVG so it matches the PNG as closely as possible, including element and text positions and sizes."""
     logger.info("Starting AI-based SVG correction using PNG reference...")
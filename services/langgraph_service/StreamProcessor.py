@@ -1,14 +1,44 @@
 # type: ignore[import]
-import traceback
-from typing import Optional, List, Dict, Any, Callable, Awaitable
+import asyncio
+import logging
+import sys
+import uuid
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
 from langchain_core.messages import AIMessageChunk, ToolCall, convert_to_openai_messages, ToolMessage
-from langgraph.graph import StateGraph
-import json
+from langgraph.graph.graph import CompiledGraph
+from services.db_service import encode_message
+
+logger = logging.getLogger(__name__)
+
+# 发送到前端的事件类型（驻留字符串，所有事件共享同一对象）
+_DONE_TYPE = sys.intern('done')
+_ALL_MESSAGES_TYPE = sys.intern('all_messages')
+_MESSAGES_APPEND_TYPE = sys.intern('messages_append')
+_MESSAGE_PART_TYPE = sys.intern('message_part')
+_DELTA_TYPE = sys.intern('delta')
+_TOOL_CALL_RESULT_TYPE = sys.intern('tool_call_result')
+_TOOL_CALL_TYPE = sys.intern('tool_call')
+_TOOL_CALL_ARGUMENTS_TYPE = sys.intern('tool_call_arguments')
+
+# 文本增量合并发送的时间窗口（秒）
+DELTA_FLUSH_INTERVAL = 0.015
+# 超过该消息数量（或工具结果内容长度）时，在线程中转换消息格式
+CONVERT_IN_THREAD_THRESHOLD = 32
+CONVERT_IN_THREAD_CONTENT_SIZE = 64 * 1024
+# 单个 websocket 帧的最大载荷，超过时拆分发送
+WS_PART_SIZE = 64 * 1024
 
 
 class StreamProcessor:
     """流式处理器 - 负责处理智能体的流式输出"""
 
+    __slots__ = (
+        'session_id', 'db_service', 'websocket_service', 'tool_calls',
+        'last_saved_message_index', 'last_streaming_tool_call_id',
+        '_save_task', 'last_active_agent', '_oai_messages', '_converted',
+        '_delta_buf', '_flush_task',
+    )
+
     def __init__(self, session_id: str, db_service: Any, websocket_service: Callable[[str, Dict[str, Any]], Awaitable[None]]):
         self.session_id = session_id
         self.db_service = db_service
@@ -16,106 +46,223 @@ class StreamProcessor:
         self.tool_calls: List[ToolCall] = []
         self.last_saved_message_index = 0
         self.last_streaming_tool_call_id: Optional[str] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self.last_active_agent: Optional[str] = None
+        # 已转换并发送给前端的 OpenAI 格式消息
+        self._oai_messages: List[Dict[str, Any]] = []
+        # 消息对象 id -> (消息对象, OpenAI 格式消息)
+        self._converted: Dict[int, Tuple[Any, Dict[str, Any]]] = {}
+        # 待合并发送的文本增量
+        self._delta_buf: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
 
-    async def process_stream(self, swarm: StateGraph, messages: List[Dict[str, Any]], context: Dict[str, Any]) -> None:
+    async def process_stream(self, compiled_swarm: CompiledGraph, messages: List[Dict[str, Any]], context: Dict[str, Any]) -> None:
         """处理整个流式响应
 
         Args:
-            swarm: 智能体群组
+            compiled_swarm: 已编译的智能体群组
             messages: 消息列表
             context: 上下文信息
         """
         self.last_saved_message_index = len(messages) - 1
 
-        compiled_swarm = swarm.compile()
-
-        async for chunk in compiled_swarm.astream(
+        async for event in compiled_swarm.astream_events(
             {"messages": messages},
             config=context,
-            stream_mode=["messages", "custom", 'values']
+            version="v2"
         ):
-            await self._handle_chunk(chunk)
+            await self._handle_event(event)
+
+        # 等待最后一批消息写入数据库
+        if self._save_task is not None:
+            await self._save_task
 
         # 发送完成事件
-        await self.websocket_service(self.session_id, {
-            'type': 'done'
+        await self._send({
+            'type': _DONE_TYPE
         })
 
-    async def _handle_chunk(self, chunk: Any) -> None:
-        # print('👇chunk', chunk)
-        """处理单个chunk"""
-        chunk_type = chunk[0]
+    async def _handle_event(self, event: Dict[str, Any]) -> None:
+        """处理单个事件，只关注模型输出流、工具结果和整个图的结束"""
+        event_type = event.get('event')
 
-        if chunk_type == 'values':
-            await self._handle_values_chunk(chunk[1])
-        else:
-            await self._handle_message_chunk(chunk[1][0])
+        if event_type == 'on_chat_model_stream':
+            await self._handle_message_chunk(event['data']['chunk'])
+        elif event_type == 'on_tool_end':
+            output = event['data'].get('output')
+            if isinstance(output, ToolMessage):
+                await self._handle_message_chunk(output)
+        elif event_type == 'on_chain_end' and not event.get('parent_ids'):
+            # 根图结束：发送并保存最终消息列表
+            output = event['data'].get('output')
+            if isinstance(output, dict):
+                await self._handle_values_chunk(output)
 
     async def _handle_values_chunk(self, chunk_data: Dict[str, Any]) -> None:
-        """处理 values 类型的 chunk"""
+        """处理最终状态中的消息列表"""
         all_messages = chunk_data.get('messages', [])
-        oai_messages = convert_to_openai_messages(all_messages)
-        # 确保 oai_messages 是列表类型
-        if not isinstance(oai_messages, list):
-            oai_messages = [oai_messages] if oai_messages else []
+        converted_count = len(self._oai_messages)
+
+        if converted_count == 0 or len(all_messages) < converted_count:
+            # 首个 chunk（或历史被截断时）发送一次完整快照
+            self._oai_messages = await self._convert_messages_async(all_messages)
+            await self._send_large({
+                'type': _ALL_MESSAGES_TYPE,
+                'messages': self._oai_messages
+            })
+        else:
+            # 之后只转换并发送新追加的消息
+            appended = await self._convert_messages_async(all_messages[converted_count:])
+            if appended:
+                self._oai_messages.extend(appended)
+                await self._send_large({
+                    'type': _MESSAGES_APPEND_TYPE,
+                    'messages': appended
+                })
+
+        oai_messages = self._oai_messages
+        new_messages = oai_messages[self.last_saved_message_index + 1:]
+
+        # 快照与追加两种情况都要根据本轮新消息更新最后活跃的智能体
+        self._update_last_active_agent(new_messages)
+
+        # 保存新消息到数据库（批量写入，后台执行，与下一个 chunk 的发送重叠）
+        rows = [
+            (new_message.get('role', 'user'), encode_message(new_message))
+            for new_message in new_messages
+        ]
+        if rows:
+            self.last_saved_message_index = len(oai_messages) - 1
+            self._save_task = asyncio.create_task(self._save_messages(rows, self._save_task))
+
+    def _update_last_active_agent(self, messages: List[Dict[str, Any]]) -> None:
+        """根据新追加的 assistant 消息更新最后活跃的智能体"""
+        for message in reversed(messages):
+            if message.get('role') == 'assistant' and message.get('name'):
+                self.last_active_agent = message['name']
+                return
 
-        # 发送所有消息到前端
+    async def _convert_messages_async(self, messages: List[Any]) -> List[Dict[str, Any]]:
+        """消息较多时在线程中转换，避免阻塞事件循环"""
+        if len(messages) > CONVERT_IN_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._convert_messages, messages)
+        return self._convert_messages(messages)
+
+    def _convert_messages(self, messages: List[Any]) -> List[Dict[str, Any]]:
+        """转换为 OpenAI 格式消息列表，复用已转换过的消息"""
+        return [self._convert_message(message) for message in messages]
+
+    def _convert_message(self, message: Any) -> Dict[str, Any]:
+        """转换单条消息，按对象身份缓存结果"""
+        cached = self._converted.get(id(message))
+        # 同时保存消息对象本身，避免对象被回收后 id 被复用导致误命中
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        oai_message = convert_to_openai_messages([message])[0]
+        self._converted[id(message)] = (message, oai_message)
+        return oai_message
+
+    async def _save_messages(self, rows: List[Tuple[str, str]], previous: Optional[asyncio.Task]) -> None:
+        """批量保存消息，先等待上一批完成以保证写入顺序"""
+        if previous is not None:
+            await previous
+        # 通过后台写入队列保存，与用户消息保持同一写入顺序
+        saved = await self.db_service.enqueue_messages(self.session_id, rows)
+        await saved
+
+    async def _send(self, event: Dict[str, Any]) -> None:
+        """发送事件前先发出缓存的文本增量，保证前端收到的顺序不变"""
+        await self._flush_deltas()
+        await self.websocket_service(self.session_id, event)
+
+    async def _send_large(self, event: Dict[str, Any]) -> None:
+        """发送可能很大的事件，超过 WS_PART_SIZE 时拆分为多个 message_part 分片
+
+        前端按 part_id 收集 idx 0..total-1 的 data 拼接后再解析为原事件
+        """
+        payload = encode_message(event)
+        if len(payload) <= WS_PART_SIZE:
+            await self._send(event)
+            return
+
+        await self._flush_deltas()
+        part_id = uuid.uuid4().hex
+        total = (len(payload) + WS_PART_SIZE - 1) // WS_PART_SIZE
+        for idx in range(total):
+            await self.websocket_service(self.session_id, {
+                'type': _MESSAGE_PART_TYPE,
+                'part_id': part_id,
+                'idx': idx,
+                'total': total,
+                'data': payload[idx * WS_PART_SIZE:(idx + 1) * WS_PART_SIZE]
+            })
+
+    def _queue_delta(self, text: str) -> None:
+        """缓存文本增量，并在需要时安排一次延迟发送"""
+        self._delta_buf.append(text)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(DELTA_FLUSH_INTERVAL)
+        await self._flush_deltas()
+
+    async def _flush_deltas(self) -> None:
+        """将缓存的文本增量合并为一条 delta 事件发送"""
+        if not self._delta_buf:
+            return
+        text = ''.join(self._delta_buf)
+        self._delta_buf = []
         await self.websocket_service(self.session_id, {
-            'type': 'all_messages',
-            'messages': oai_messages
+            'type': _DELTA_TYPE,
+            'text': text
         })
 
-        # 保存新消息到数据库
-        for i in range(self.last_saved_message_index + 1, len(oai_messages)):
-            new_message = oai_messages[i]
-            if len(oai_messages) > 0:  # 确保有消息才保存
-                await self.db_service.create_message(
-                    self.session_id,
-                    new_message.get('role', 'user'),
-                    json.dumps(new_message)
-                )
-            self.last_saved_message_index = i
-
     async def _handle_message_chunk(self, ai_message_chunk: AIMessageChunk) -> None:
         """处理消息类型的 chunk"""
-        # print('👇ai_message_chunk', ai_message_chunk)
         try:
             content = ai_message_chunk.content
+            tool_calls = getattr(ai_message_chunk, 'tool_calls', None)
+            tool_call_chunks = getattr(ai_message_chunk, 'tool_call_chunks', None)
 
             if isinstance(ai_message_chunk, ToolMessage):
-                # 工具调用结果之后会在 values 类型中发送到前端，这里会更快出现一些
-                oai_message = convert_to_openai_messages([ai_message_chunk])[0]
-                print('👇toolcall res oai_message', oai_message)
-                await self.websocket_service(self.session_id, {
-                    'type': 'tool_call_result',
+                # 工具调用结果之后会在最终消息列表中发送到前端，这里会更快出现一些
+                if isinstance(content, str) and len(content) > CONVERT_IN_THREAD_CONTENT_SIZE:
+                    oai_message = await asyncio.to_thread(self._convert_message, ai_message_chunk)
+                else:
+                    oai_message = self._convert_message(ai_message_chunk)
+                logger.debug('👇toolcall res oai_message %s', oai_message)
+                await self._send_large({
+                    'type': _TOOL_CALL_RESULT_TYPE,
                     'id': ai_message_chunk.tool_call_id,
                     'message': oai_message
                 })
+            elif isinstance(content, str) and content:
+                # 文本内容先缓存，在时间窗口内合并后发送
+                self._queue_delta(content)
             elif content:
-                # 发送文本内容
-                await self.websocket_service(self.session_id, {
-                    'type': 'delta',
+                await self._send({
+                    'type': _DELTA_TYPE,
                     'text': content
                 })
-            elif hasattr(ai_message_chunk, 'tool_calls') and ai_message_chunk.tool_calls and ai_message_chunk.tool_calls[0].get('name'):
+            elif tool_calls and tool_calls[0].get('name'):
                 # 处理工具调用
-                await self._handle_tool_calls(ai_message_chunk.tool_calls)
+                await self._handle_tool_calls(tool_calls)
 
             # 处理工具调用参数流
-            if hasattr(ai_message_chunk, 'tool_call_chunks'):
-                await self._handle_tool_call_chunks(ai_message_chunk.tool_call_chunks)
-        except Exception as e:
-            print('🟠error', e)
-            traceback.print_stack()
+            if tool_call_chunks:
+                await self._handle_tool_call_chunks(tool_call_chunks)
+        except Exception:
+            logger.exception('🟠error handling message chunk')
 
     async def _handle_tool_calls(self, tool_calls: List[ToolCall]) -> None:
         """处理工具调用"""
         self.tool_calls = [tc for tc in tool_calls if tc.get('name')]
-        print('😘tool_call event', tool_calls)
+        logger.debug('😘tool_call event %s', tool_calls)
 
         for tool_call in self.tool_calls:
-            await self.websocket_service(self.session_id, {
-                'type': 'tool_call',
+            await self._send({
+                'type': _TOOL_CALL_TYPE,
                 'id': tool_call.get('id'),
                 'name': tool_call.get('name'),
                 'arguments': '{}'
@@ -129,10 +276,10 @@ class StreamProcessor:
                 self.last_streaming_tool_call_id = tool_call_chunk.get('id')
             else:
                 if self.last_streaming_tool_call_id:
-                    await self.websocket_service(self.session_id, {
-                        'type': 'tool_call_arguments',
+                    await self._send({
+                        'type': _TOOL_CALL_ARGUMENTS_TYPE,
                         'id': self.last_streaming_tool_call_id,
                         'text': tool_call_chunk.get('args')
                     })
                 else:
-                    print('🟠no last_streaming_tool_call_id', tool_call_chunk)
+                    logger.debug('🟠no last_streaming_tool_call_id %s', tool_call_chunk)
@@ -1,4 +1,7 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+import functools
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from langgraph.prebuilt import create_react_agent  # type: ignore
 from langgraph.graph.graph import CompiledGraph
 from langchain_core.tools import BaseTool
@@ -8,6 +11,29 @@ from .configs import PlannerAgentConfig, create_handoff_tool, BaseAgentConfig
 from services.tool_service import tool_service
 
 
+# 已创建的智能体缓存：(模型 id, 工具 id 列表, 系统提示词, 工具注册表版本) -> (模型, 智能体列表)
+# create_react_agent 返回的已编译图不保存会话状态，可以在会话间共享
+_AGENTS_CACHE_MAX = 64
+_agents_cache: "OrderedDict[Tuple[Any, ...], Tuple[Any, List[CompiledGraph]]]" = OrderedDict()
+
+# 每个会话最后活跃的智能体缓存，避免每次请求都反向扫描消息历史
+_LAST_ACTIVE_AGENT_CACHE_MAX = 1024
+_last_active_agents: "OrderedDict[str, str]" = OrderedDict()
+
+
+@functools.lru_cache(maxsize=1)
+def _planner_config() -> PlannerAgentConfig:
+    """规划智能体配置不依赖输入，进程内只构建一次"""
+    return PlannerAgentConfig()
+
+
+@functools.lru_cache(maxsize=32)
+def _image_video_creator_config(tools_key: Tuple[Tuple[str, str], ...]) -> ImageVideoCreatorAgentConfig:
+    """按 (工具 id, provider) 列表缓存图像视频创作智能体配置"""
+    return ImageVideoCreatorAgentConfig(
+        [{'id': tool_id, 'provider': provider} for tool_id, provider in tools_key])
+
+
 class AgentManager:
     """智能体管理器 - 负责创建和管理所有智能体
 
@@ -15,7 +41,7 @@ class AgentManager:
     """
 
     @staticmethod
-    def create_agents(
+    async def create_agents(
         model: Any,
         tool_list: List[ToolInfoJson],
         system_prompt: str = ""
@@ -30,6 +56,18 @@ class AgentManager:
         Returns:
             List[Any]: 创建好的智能体列表
         """
+        cache_key = (
+            id(model),
+            tuple(tool.get('id') for tool in tool_list),
+            system_prompt,
+            tool_service.version,
+        )
+        cached = _agents_cache.get(cache_key)
+        # 同时比较模型对象本身，避免模型被回收后 id 被复用导致误命中
+        if cached is not None and cached[0] is model:
+            _agents_cache.move_to_end(cache_key)
+            return cached[1]
+
         # 为不同类型的智能体过滤合适的工具
         image_tools =  [tool for tool in tool_list if tool.get('type') == 'image']
         video_tools = [tool for tool in tool_list if tool.get('type') == 'video']
@@ -37,9 +75,7 @@ class AgentManager:
         print(f"📸 图像工具: {image_tools}")
         print(f"🎬 视频工具: {video_tools}")
 
-        planner_config = PlannerAgentConfig()
-        planner_agent = AgentManager._create_langgraph_agent(
-            model, planner_config)
+        planner_config = _planner_config()
 
         # image_designer_config = ImageDesignerAgentConfig(
         #     image_tools, system_prompt)
@@ -53,11 +89,23 @@ class AgentManager:
         # video_designer_agent = AgentManager._create_langgraph_agent(
         #     model, video_designer_config)
 
-        image_video_creator_config = ImageVideoCreatorAgentConfig(tool_list)
-        image_video_creator_agent = AgentManager._create_langgraph_agent(
-            model, image_video_creator_config)
+        image_video_creator_config = _image_video_creator_config(
+            tuple((tool['id'], tool.get('provider', '')) for tool in tool_list))
 
-        return [planner_agent, image_video_creator_agent]
+        # 在线程中并发创建智能体，避免阻塞事件循环
+        planner_agent, image_video_creator_agent = await asyncio.gather(
+            asyncio.to_thread(
+                AgentManager._create_langgraph_agent, model, planner_config),
+            asyncio.to_thread(
+                AgentManager._create_langgraph_agent, model, image_video_creator_config),
+        )
+
+        agents = [planner_agent, image_video_creator_agent]
+        _agents_cache[cache_key] = (model, agents)
+        _agents_cache.move_to_end(cache_key)
+        while len(_agents_cache) > _AGENTS_CACHE_MAX:
+            _agents_cache.popitem(last=False)
+        return agents
 
     @staticmethod
     def _create_langgraph_agent(
@@ -74,21 +122,17 @@ class AgentManager:
             Any: 创建好的 LangGraph 智能体实例
         """
         # 创建智能体间切换工具
-        handoff_tools: List[BaseTool] = []
-        for handoff in config.handoffs:
-            handoff_tool = create_handoff_tool(
+        handoff_tools: List[BaseTool] = [
+            create_handoff_tool(
                 agent_name=handoff['agent_name'],
                 description=handoff['description'],
             )
-            if handoff_tool:
-                handoff_tools.append(handoff_tool)
+            for handoff in config.handoffs
+        ] if config.handoffs else []
 
         # 获取业务工具
-        business_tools: List[BaseTool] = []
-        for tool_json in config.tools:
-            tool = tool_service.get_tool(tool_json['id'])
-            if tool:
-                business_tools.append(tool)
+        business_tools: List[BaseTool] = tool_service.get_tools_bulk(
+            config.tool_ids) if config.tool_ids else []
 
         # 创建并返回 LangGraph 智能体
         return create_react_agent(
@@ -98,23 +142,47 @@ class AgentManager:
             prompt=config.system_prompt
         )
 
+    @staticmethod
+    def remember_last_active_agent(session_id: str, agent_name: str) -> None:
+        """记录会话最后活跃的智能体
+
+        Args:
+            session_id: 会话ID
+            agent_name: 智能体名称
+        """
+        _last_active_agents[session_id] = agent_name
+        _last_active_agents.move_to_end(session_id)
+        while len(_last_active_agents) > _LAST_ACTIVE_AGENT_CACHE_MAX:
+            _last_active_agents.popitem(last=False)
+
     @staticmethod
     def get_last_active_agent(
         messages: List[Dict[str, Any]],
-        agent_names: List[str]
+        agent_names: List[str],
+        session_id: Optional[str] = None
     ) -> Optional[str]:
         """获取最后活跃的智能体
 
+        优先读取会话缓存，未命中时才反向扫描消息历史
+
         Args:
             messages: 消息历史
             agent_names: 智能体名称列表
+            session_id: 会话ID
 
         Returns:
             Optional[str]: 最后活跃的智能体名称，如果没有则返回 None
         """
+        if session_id:
+            cached = _last_active_agents.get(session_id)
+            if cached in agent_names:
+                return cached
+
         for message in reversed(messages):
             if message.get('role') == 'assistant':
                 message_name = message.get('name')
                 if message_name and message_name in agent_names:
+                    if session_id:
+                        AgentManager.remember_last_active_agent(session_id, message_name)
                     return message_name
         return None
@@ -1,15 +1,18 @@
 from models.tool_model import ToolInfoJson
+import hashlib
+from collections import OrderedDict
 from services.db_service import db_service
 from .StreamProcessor import StreamProcessor
 from .agent_manager import AgentManager
 import traceback
 from utils.http_client import HttpClient
 from langgraph_swarm import create_swarm  # type: ignore
+from langgraph.graph.graph import CompiledGraph
 from langchain_openai import ChatOpenAI
 from langchain_ollama import ChatOllama
 from services.websocket_service import send_to_websocket  # type: ignore
 from services.config_service import config_service
-from typing import Optional, List, Dict, Any, cast, Set
+from typing import Optional, List, Dict, Any, cast, FrozenSet, Tuple
 from typing_extensions import TypedDict
 from models.config_model import ModelInfo
 
@@ -30,15 +33,23 @@ def _fix_chat_history(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not messages:
         return messages
 
-    fixed_messages: List[Dict[str, Any]] = []
-    tool_call_ids: Set[str] = set()
-
     # 第一遍：收集所有ToolMessage的tool_call_id
-    for msg in messages:
-        if msg.get('role') == 'tool' and msg.get('tool_call_id'):
-            tool_call_id = msg.get('tool_call_id')
-            if tool_call_id:
-                tool_call_ids.add(tool_call_id)
+    tool_call_ids: FrozenSet[str] = frozenset(
+        msg['tool_call_id'] for msg in messages
+        if msg.get('role') == 'tool' and msg.get('tool_call_id')
+    )
+
+    # 常见情况：所有tool_calls都有对应的ToolMessage，无需修复，直接返回原列表
+    needs_fix = any(
+        tool_call.get('id') not in tool_call_ids
+        for msg in messages
+        if msg.get('role') == 'assistant' and msg.get('tool_calls')
+        for tool_call in msg['tool_calls']
+    )
+    if not needs_fix:
+        return messages
+
+    fixed_messages: List[Dict[str, Any]] = []
 
     # 第二遍：修复AIMessage中的tool_calls
     for msg in messages:
@@ -101,8 +112,8 @@ async def langgraph_multi_agent(
         # 2. 文本模型
         text_model_instance = _create_text_model(text_model)
 
-        # 3. 创建智能体
-        agents = AgentManager.create_agents(
+        # 3. 创建智能体（按模型、工具与系统提示词缓存）
+        agents = await AgentManager.create_agents(
             text_model_instance,
             tool_list,  # 传入所有注册的工具
             system_prompt or ""
@@ -110,15 +121,13 @@ async def langgraph_multi_agent(
         agent_names = [agent.name for agent in agents]
         print('👇agent_names', agent_names)
         last_agent = AgentManager.get_last_active_agent(
-            fixed_messages, agent_names)
+            fixed_messages, agent_names, session_id)
 
         print('👇last_agent', last_agent)
 
-        # 4. 创建智能体群组
-        swarm = create_swarm(
-            agents=agents,  # type: ignore
-            default_active_agent=last_agent if last_agent else agent_names[0]
-        )
+        # 4. 获取已编译的智能体群组
+        compiled_swarm = _get_compiled_swarm(
+            agents, last_agent if last_agent else agent_names[0])
 
         # 5. 创建上下文
         context = {
@@ -130,12 +139,46 @@ async def langgraph_multi_agent(
         # 6. 流处理
         processor = StreamProcessor(
             session_id, db_service, send_to_websocket)  # type: ignore
-        await processor.process_stream(swarm, fixed_messages, context)
+        try:
+            await processor.process_stream(compiled_swarm, fixed_messages, context)
+        finally:
+            if processor.last_active_agent:
+                AgentManager.remember_last_active_agent(
+                    session_id, processor.last_active_agent)
 
     except Exception as e:
         await _handle_error(e, session_id)
 
 
+# 已编译的智能体群组缓存，避免每轮对话重复编译
+_SWARM_CACHE_MAX = 64
+_compiled_swarms: "OrderedDict[Tuple[int, str], Tuple[List[CompiledGraph], CompiledGraph]]" = OrderedDict()
+
+
+def _get_compiled_swarm(agents: List[CompiledGraph], default_active_agent: str) -> CompiledGraph:
+    """获取（必要时编译）智能体群组"""
+    swarm_key = (id(agents), default_active_agent)
+    cached = _compiled_swarms.get(swarm_key)
+    # 缓存值中保存智能体列表本身，避免列表被回收后 id 被复用导致误命中
+    if cached is not None and cached[0] is agents:
+        _compiled_swarms.move_to_end(swarm_key)
+        return cached[1]
+
+    compiled_swarm = create_swarm(
+        agents=agents,  # type: ignore
+        default_active_agent=default_active_agent
+    ).compile()
+    _compiled_swarms[swarm_key] = (agents, compiled_swarm)
+    _compiled_swarms.move_to_end(swarm_key)
+    while len(_compiled_swarms) > _SWARM_CACHE_MAX:
+        _compiled_swarms.popitem(last=False)
+    return compiled_swarm
+
+
+# 语言模型实例缓存，键为 (provider, model, url, api_key 哈希)
+_text_models: Dict[Tuple[Any, ...], Any] = {}
+
+
 def _create_text_model(text_model: ModelInfo) -> Any:
     """创建语言模型实例"""
     model = text_model.get('model')
@@ -147,16 +190,22 @@ def _create_text_model(text_model: ModelInfo) -> Any:
     # TODO: Verify if max token is working
     # max_tokens = text_model.get('max_tokens', 8148)
 
+    cache_key = (provider, model, url,
+                 hashlib.sha256(api_key.encode()).hexdigest() if api_key else "")
+    cached_model = _text_models.get(cache_key)
+    if cached_model is not None:
+        return cached_model
+
     if provider == 'ollama':
-        return ChatOllama(
+        text_model_instance = ChatOllama(
             model=model,
             base_url=url,
         )
     else:
-        # Create httpx client with SSL configuration for ChatOpenAI
-        http_client = HttpClient.create_sync_client()
-        http_async_client = HttpClient.create_async_client()
-        return ChatOpenAI(
+        # 使用共享的 httpx 客户端（带 SSL 配置），复用 keep-alive 连接
+        http_client = HttpClient.get_shared_sync_client()
+        http_async_client = HttpClient.get_shared_async_client()
+        text_model_instance = ChatOpenAI(
             model=model,
             api_key=api_key,  # type: ignore
             timeout=300,
@@ -167,6 +216,9 @@ def _create_text_model(text_model: ModelInfo) -> Any:
             http_async_client=http_async_client
         )
 
+    _text_models[cache_key] = text_model_instance
+    return text_model_instance
+
 
 async def _handle_error(error: Exception, session_id: str) -> None:
     """处理错误"""
@@ -1,4 +1,5 @@
-from typing import Annotated, Optional, Dict, Any, Sequence, List
+import functools
+from typing import Annotated, Optional, Dict, Any, Sequence, List, Tuple
 from typing_extensions import TypedDict
 from langgraph.types import Command
 from langgraph.prebuilt import InjectedState
@@ -18,6 +19,7 @@ def _normalize_agent_name(name: str) -> str:
     return name.lower().replace(" ", "_").replace("-", "_")
 
 
+@functools.lru_cache(maxsize=256)
 def create_handoff_tool(
     *, agent_name: str, name: Optional[str] = None, description: Optional[str] = None
 ) -> BaseTool:
@@ -34,6 +36,9 @@ def create_handoff_tool(
             If not provided, the tool name will be `transfer_to_<agent_name>`.
         description: Optional description for the handoff tool.
             If not provided, the tool description will be `Ask agent <agent_name> for help`.
+
+    Tools are stateless, so results are memoized per (agent_name, name, description)
+    and shared across sessions.
     """
     if name is None:
         name = f"transfer_to_{_normalize_agent_name(agent_name)}"
@@ -82,6 +87,8 @@ class BaseAgentConfig:
     实际的智能体将通过 LangGraph 的 create_react_agent 函数创建。
     """
 
+    __slots__ = ('name', 'tools', 'system_prompt', 'handoffs', 'tool_ids')
+
     def __init__(
         self,
         name: str,
@@ -92,4 +99,6 @@ class BaseAgentConfig:
         self.name = name
         self.tools = tools
         self.system_prompt = system_prompt
-        self.handoffs: List[HandoffConfig] = handoffs or []
\ No newline at end of file
+        self.handoffs: List[HandoffConfig] = handoffs or []
+        # 工具 id 元组，创建智能体时直接用于批量查找工具
+        self.tool_ids: Tuple[str, ...] = tuple(tool['id'] for tool in tools)
\ No newline at end of file
@@ -1,14 +1,10 @@
+import functools
 from typing import List
 
 from models.tool_model import ToolInfoJson
 from .base_config import BaseAgentConfig, HandoffConfig
 
-class ImageDesignerAgentConfig(BaseAgentConfig):
-    """图像设计智能体 - 专门负责图像生成
-    """
-
-    def __init__(self, tool_list: List[ToolInfoJson], system_prompt: str = "") -> None:
-        batch_generation_prompt = """
+_BATCH_GENERATION_PROMPT = """
 
 BATCH GENERATION RULES:
 - If user needs >10 images: Generate in batches of max 10 images each
@@ -17,7 +13,7 @@ BATCH GENERATION RULES:
 
 """
 
-        error_handling_prompt = """
+_ERROR_HANDLING_PROMPT = """
 
 ERROR HANDLING INSTRUCTIONS:
 When image generation fails, you MUST:
@@ -36,8 +32,21 @@ When image generation fails, you MUST:
 IMPORTANT: Never ignore tool errors. Always respond to failed tool calls with helpful guidance for the user.
 """
 
-        full_system_prompt = system_prompt + \
-            batch_generation_prompt + error_handling_prompt
+
+@functools.lru_cache(maxsize=32)
+def _build_system_prompt(system_prompt: str) -> str:
+    """拼接完整系统提示词"""
+    return f"{system_prompt}{_BATCH_GENERATION_PROMPT}{_ERROR_HANDLING_PROMPT}"
+
+
+class ImageDesignerAgentConfig(BaseAgentConfig):
+    """图像设计智能体 - 专门负责图像生成
+    """
+
+    __slots__ = ()
+
+    def __init__(self, tool_list: List[ToolInfoJson], system_prompt: str = "") -> None:
+        full_system_prompt = _build_system_prompt(system_prompt)
 
         # 图像设计智能体不需要切换到其他智能体
         handoffs: List[HandoffConfig] = [
@@ -1,3 +1,4 @@
+import sys
 from typing import List
 
 from models.tool_model import ToolInfoJson
@@ -43,9 +44,7 @@ Discreet modular grid lines and data glyphs fade into matte charcoal background,
 3. If it is a video generation task, use video generation tools to generate the video. You can choose to generate the necessary images first, and then use the images to generate the video, or directly generate the video using text prompt.
 """
 
-class ImageVideoCreatorAgentConfig(BaseAgentConfig):
-    def __init__(self, tool_list: List[ToolInfoJson]) -> None:
-        batch_generation_prompt = """
+_BATCH_GENERATION_PROMPT = """
 
 BATCH GENERATION RULES:
 - If user needs >10 images: Generate in batches of max 10 images each
@@ -54,7 +53,7 @@ BATCH GENERATION RULES:
 
 """
 
-        error_handling_prompt = """
+_ERROR_HANDLING_PROMPT = """
 
 ERROR HANDLING INSTRUCTIONS:
 When image generation fails, you MUST:
@@ -73,15 +72,20 @@ When image generation fails, you MUST:
 IMPORTANT: Never ignore tool errors. Always respond to failed tool calls with helpful guidance for the user.
 """
 
-        full_system_prompt = system_prompt + \
-            batch_generation_prompt + error_handling_prompt
+_FULL_SYSTEM_PROMPT = sys.intern(''.join(
+    (system_prompt, _BATCH_GENERATION_PROMPT, _ERROR_HANDLING_PROMPT)))
+
 
+class ImageVideoCreatorAgentConfig(BaseAgentConfig):
+    __slots__ = ()
+
+    def __init__(self, tool_list: List[ToolInfoJson]) -> None:
         # 图像设计智能体不需要切换到其他智能体
         handoffs: List[HandoffConfig] = []
 
         super().__init__(
             name='image_video_creator',
             tools=tool_list,
-            system_prompt=full_system_prompt,
+            system_prompt=_FULL_SYSTEM_PROMPT,
             handoffs=handoffs
         )
@@ -1,13 +1,9 @@
+import sys
 from typing import List
 from .base_config import BaseAgentConfig, HandoffConfig
 
 
-class PlannerAgentConfig(BaseAgentConfig):
-    """规划智能体 - 负责制定执行计划
-    """
-
-    def __init__(self) -> None:
-        system_prompt = """
+_SYSTEM_PROMPT = sys.intern("""
             You are a design planning writing agent. Answer and write plan in the SAME LANGUAGE as the user's prompt. You should do:
             - Step 1. If it is a complex task requiring multiple steps, write a execution plan for the user's request using the SAME LANGUAGE AS THE USER'S PROMPT. You should breakdown the task into high level steps for the other agents to execute.
             - Step 2. If it is a image/video generation or editing task, transfer the task to image_video_creator agent to generate the image based on the plan IMMEDIATELY, no need to ask for user's approval.
@@ -36,8 +32,16 @@ class PlannerAgentConfig(BaseAgentConfig):
                 "description": "Generate the video clips from the images"
             }]
             ```
-            """
+            """)
+
 
+class PlannerAgentConfig(BaseAgentConfig):
+    """规划智能体 - 负责制定执行计划
+    """
+
+    __slots__ = ()
+
+    def __init__(self) -> None:
         handoffs: List[HandoffConfig] = [
             {
                 'agent_name': 'image_video_creator',
@@ -50,6 +54,6 @@ class PlannerAgentConfig(BaseAgentConfig):
         super().__init__(
             name='planner',
             tools=[{'id': 'write_plan', 'provider': 'system'}],
-            system_prompt=system_prompt,
+            system_prompt=_SYSTEM_PROMPT,
             handoffs=handoffs
         )
@@ -1,14 +1,10 @@
+import sys
 from typing import List
 from models.tool_model import ToolInfoJson
 from .base_config import BaseAgentConfig, HandoffConfig
 
 
-class VideoDesignerAgentConfig(BaseAgentConfig):
-    """视频设计智能体 - 专门负责视频生成
-    """
-
-    def __init__(self, tool_list: List[ToolInfoJson]) -> None:
-        video_generation_prompt = """
+_VIDEO_GENERATION_PROMPT = """
 You are a video designer. You are responsible for generating videos based on user request. You can generate video from text prompt and images.
 
 VIDEO GENERATION RULES:
@@ -20,7 +16,7 @@ VIDEO GENERATION RULES:
 
 """
 
-        error_handling_prompt = """
+_ERROR_HANDLING_PROMPT = """
 
 ERROR HANDLING INSTRUCTIONS:
 When video generation fails, you MUST:
@@ -39,8 +35,17 @@ When video generation fails, you MUST:
 IMPORTANT: Never ignore tool errors. Always respond to failed tool calls with helpful guidance for the user.
 """
 
-        full_system_prompt = video_generation_prompt + error_handling_prompt
+_FULL_SYSTEM_PROMPT = sys.intern(''.join(
+    (_VIDEO_GENERATION_PROMPT, _ERROR_HANDLING_PROMPT)))
+
 
+class VideoDesignerAgentConfig(BaseAgentConfig):
+    """视频设计智能体 - 专门负责视频生成
+    """
+
+    __slots__ = ()
+
+    def __init__(self, tool_list: List[ToolInfoJson]) -> None:
         # 视频设计智能体不需要切换到其他智能体
         handoffs: List[HandoffConfig] = [
             {
@@ -54,6 +59,6 @@ IMPORTANT: Never ignore tool errors. Always respond to failed tool calls with he
         super().__init__(
             name='video_designer',
             tools=tool_list,
-            system_prompt=full_system_prompt,
+            system_prompt=_FULL_SYSTEM_PROMPT,
             handoffs=handoffs
         )
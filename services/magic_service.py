@@ -2,17 +2,29 @@
 
 # Import necessary modules
 import asyncio
-import json
-from typing import Dict, Any, List
+import hashlib
+from typing import Dict, Any, List, Tuple
 
 # Import service modules
-from services.db_service import db_service
+from services.db_service import db_service, encode_message
 from services.OpenAIAgents_service import create_magic_response
 from services.websocket_service import send_to_websocket  # type: ignore
 from services.stream_service import add_stream_task, remove_stream_task
 from models.config_model import ModelInfo
 
 
+# Magic generation tasks currently running, keyed by session_id, together
+# with the digest of the message that started them
+_inflight: Dict[str, Tuple[str, "asyncio.Task[None]"]] = {}
+
+
+def _message_digest(messages: List[Dict[str, Any]]) -> str:
+    """Digest of the latest message, used to recognise duplicate requests"""
+    if not messages:
+        return ''
+    return hashlib.blake2b(encode_message(messages[-1]).encode(), digest_size=16).hexdigest()
+
+
 async def handle_magic(data: Dict[str, Any]) -> None:
     """
     Handle an incoming magic generation request.
@@ -46,21 +58,36 @@ async def handle_magic(data: Dict[str, Any]) -> None:
         'tool_list': tool_list
     })
 
-    # If there is only one message, create a new magic session
-    if len(messages) == 1:
-        # create new session
-        prompt = messages[0].get('content', '')
-        await db_service.create_chat_session(session_id, text_model.get('model'), text_model.get('provider'), canvas_id, (prompt[:200] if isinstance(prompt, str) else ''))
-
-    # Save user message to database
-    if len(messages) > 0:
-        await db_service.create_message(session_id, messages[-1].get('role', 'user'), json.dumps(messages[-1]))
+    # Coalesce duplicate requests (retries, double clicks) for a session that
+    # is already generating the same message: wait for the running generation
+    # instead of starting a second one. A different message is rejected
+    # explicitly rather than silently dropped
+    digest = _message_digest(messages)
+    inflight = _inflight.get(session_id)
+    if inflight is not None and not inflight[1].done():
+        inflight_digest, inflight_task = inflight
+        if inflight_digest != digest:
+            print(f"✨ magic generation already running for session {session_id}, rejecting new message")
+            await send_to_websocket(session_id, {
+                'type': 'error',
+                'error': 'A magic generation is already running for this session, please wait for it to finish'
+            })
+            return
+        print(f"✨ magic generation already running for session {session_id}, waiting for it")
+        # asyncio.wait neither raises the task's outcome nor cancels it
+        await asyncio.wait({inflight_task})
+        return
+
+    # Create the session concurrently with generation; the generation task
+    # waits for it before saving the turn's messages
+    session_saved = asyncio.create_task(_save_session(messages, session_id, canvas_id, text_model))
 
     # Create and start magic generation task
-    task = asyncio.create_task(_process_magic_generation(messages, session_id, canvas_id))
+    task = asyncio.create_task(_process_magic_generation(messages, session_id, canvas_id, session_saved))
 
     # Register the task in stream_tasks (for possible cancellation)
     add_stream_task(session_id, task)
+    _inflight[session_id] = (digest, task)
     try:
         # Await completion of the magic generation task
         await task
@@ -69,15 +96,36 @@ async def handle_magic(data: Dict[str, Any]) -> None:
     finally:
         # Always remove the task from stream_tasks after completion/cancellation
         remove_stream_task(session_id)
+        inflight = _inflight.get(session_id)
+        if inflight is not None and inflight[1] is task:
+            del _inflight[session_id]
         # Notify frontend WebSocket that magic generation is done
-        await send_to_websocket(session_id, {
+        # (shielded so a cancellation cannot drop the terminal event)
+        await asyncio.shield(send_to_websocket(session_id, {
             'type': 'done'
-        })
+        }))
 
     print('✨ magic_service 处理完成')
 
 
-async def _process_magic_generation(messages: List[Dict[str, Any]], session_id: str, canvas_id: str) -> None:
+async def _save_session(messages: List[Dict[str, Any]], session_id: str, canvas_id: str, text_model: ModelInfo) -> None:
+    """
+    Create the chat session when this is the first message.
+
+    Args:
+        messages: List of messages
+        session_id: Session ID
+        canvas_id: Canvas ID
+        text_model: Text model configuration
+    """
+    # If there is only one message, create a new magic session
+    if len(messages) == 1:
+        # create new session
+        prompt = messages[0].get('content', '')
+        await db_service.create_chat_session(session_id, text_model.get('model'), text_model.get('provider'), canvas_id, (prompt[:200] if isinstance(prompt, str) else ''))
+
+
+async def _process_magic_generation(messages: List[Dict[str, Any]], session_id: str, canvas_id: str, session_saved: "asyncio.Task[None]") -> None:
     """
     Process magic generation in a separate async task.
     
@@ -85,12 +133,24 @@ async def _process_magic_generation(messages: List[Dict[str, Any]], session_id:
         messages: List of messages
         session_id: Session ID
         canvas_id: Canvas ID
+        session_saved: Task creating the session, awaited before saving messages
     """
-    # Create AI response using OpenAI API
-    ai_response = await create_magic_response(messages, session_id, canvas_id)
-
-    # Save AI response to database
-    await db_service.create_message(session_id, 'assistant', json.dumps(ai_response))
+    # The user message and the AI response are saved together in one batch
+    rows = [(messages[-1].get('role', 'user'), encode_message(messages[-1]))] if messages else []
+    try:
+        # Create AI response using OpenAI API
+        ai_response = await create_magic_response(
+            messages, session_id, canvas_id,
+            on_delta=lambda text: send_to_websocket(session_id, {'type': 'delta', 'text': text}))
+        rows.append(('assistant', encode_message(ai_response)))
+    finally:
+        # Save the user message even if generation failed or was cancelled.
+        # asyncio.wait does not raise, so a failed session insert is logged
+        # here instead of masking the generation's own exception
+        await asyncio.wait({session_saved})
+        if not session_saved.cancelled() and session_saved.exception() is not None:
+            print(f"❌ Failed to create magic session {session_id}: {session_saved.exception()}")
+        await db_service.create_messages_bulk(session_id, rows)
 
     # Send messages to frontend immediately
     all_messages = messages + [ai_response]
@@ -1,37 +1,33 @@
-from typing import List, Type
+from bisect import bisect_right
+from typing import Tuple, Type
 import sqlite3
 from services.migrations.v1_initial_schema import V1InitialSchema
 from services.migrations.v2_add_canvases import V2AddCanvases
 from services.migrations.v3_add_comfy_workflow import V3AddComfyWorkflow
+from services.migrations.v4_add_canvas_session_index import V4AddCanvasSessionIndex
 from . import Migration
 
 # Database version
-CURRENT_VERSION = 3
+CURRENT_VERSION = 4
+
+# (version, migration class) pairs, sorted by version
+ALL_MIGRATIONS: Tuple[Tuple[int, Type[Migration]], ...] = tuple(sorted((
+    (1, V1InitialSchema),
+    (2, V2AddCanvases),
+    (3, V3AddComfyWorkflow),
+    (4, V4AddCanvasSessionIndex),
+), key=lambda m: m[0]))
+_VERSIONS: Tuple[int, ...] = tuple(version for version, _ in ALL_MIGRATIONS)
+
 
-ALL_MIGRATIONS = [
-    {
-        'version': 1,
-        'migration': V1InitialSchema,
-    },
-    {
-        'version': 2,
-        'migration': V2AddCanvases,
-    },
-    {
-        'version': 3,
-        'migration': V3AddComfyWorkflow,
-    },
-]
 class MigrationManager:
-    def get_migrations_to_apply(self, current_version: int, target_version: int) -> List[Type[Migration]]:
+    def get_migrations_to_apply(self, current_version: int, target_version: int) -> Tuple[Tuple[int, Type[Migration]], ...]:
         """Get list of migrations to apply"""
-        return [m for m in ALL_MIGRATIONS
-                if m['version'] > current_version and m['version'] <= target_version]
+        return ALL_MIGRATIONS[bisect_right(_VERSIONS, current_version):bisect_right(_VERSIONS, target_version)]
 
-    def get_migrations_to_rollback(self, current_version: int, target_version: int) -> List[Type[Migration]]:
+    def get_migrations_to_rollback(self, current_version: int, target_version: int) -> Tuple[Tuple[int, Type[Migration]], ...]:
         """Get list of migrations to rollback"""
-        return [m for m in reversed(ALL_MIGRATIONS)
-                if m['version'] <= current_version and m['version'] > target_version]
+        return ALL_MIGRATIONS[bisect_right(_VERSIONS, target_version):bisect_right(_VERSIONS, current_version)][::-1]
 
     def migrate(self, conn: sqlite3.Connection, from_version: int, to_version: int) -> None:
         """Apply or rollback migrations to reach target version"""
@@ -40,19 +36,32 @@ class MigrationManager:
             print('🦄 Applying migrations forward', from_version, '->', to_version)
             migrations_to_apply = self.get_migrations_to_apply(from_version, to_version)
             print('🦄 Migrations to apply', migrations_to_apply)
-            for migration in migrations_to_apply:
-                migration_class = migration['migration']
-                migration = migration_class()
-                print(f"Applying migration {migration.version}: {migration.description}")
-                migration.up(conn)
-                conn.execute("UPDATE db_version SET version = ?", (migration.version,))
+            # Pragmas cannot change inside a transaction, so close any pending one first
+            if conn.in_transaction:
+                conn.commit()
+            # journal_mode=WAL is set once by DatabaseService._init_db
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            # Apply every migration in one transaction: a single commit, and a
+            # failed migration leaves the database at the previous version
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for _, migration_class in migrations_to_apply:
+                    migration = migration_class()
+                    print(f"Applying migration {migration.version}: {migration.description}")
+                    migration.up(conn)
+                    conn.execute("UPDATE db_version SET version = ?", (migration.version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
         # Do not do rollback migrations
         # else:
         #     # Rollback migrations
         #     print('🦄 Rolling back migrations', from_version, '->', to_version)
         #     migrations_to_rollback = self.get_migrations_to_rollback(from_version, to_version)
         #     print('🦄 Migrations to rollback', migrations_to_rollback)
-        #     for migration_class in migrations_to_rollback:
+        #     for _, migration_class in migrations_to_rollback:
         #         migration = migration_class()
         #         print(f"Rolling back migration {migration.version}: {migration.description}")
         #         migration.down(conn)
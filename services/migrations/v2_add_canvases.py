@@ -24,14 +24,13 @@ class V2AddCanvases(Migration):
             CREATE INDEX IF NOT EXISTS idx_canvases_updated_at ON canvases(updated_at DESC, id DESC)
         """)
 
-        # Check if canvas_id column already exists in chat_sessions
-        cursor = conn.execute("PRAGMA table_info(chat_sessions)")
-        columns = [column[1] for column in cursor.fetchall()]
-
-        if 'canvas_id' not in columns:
-            # Add canvas_id column to chat_sessions only if it doesn't exist
+        # Add canvas_id column to chat_sessions, ignoring it if it already exists
+        try:
             conn.execute(
                 "ALTER TABLE chat_sessions ADD COLUMN canvas_id TEXT REFERENCES canvases(id)")
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e).lower():
+                raise
 
         # Create default canvas
         conn.execute("""
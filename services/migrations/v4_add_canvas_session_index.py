@@ -0,0 +1,16 @@
+from . import Migration
+import sqlite3
+
+
+class V4AddCanvasSessionIndex(Migration):
+    version = 4
+    description = "Add canvas session index"
+
+    def up(self, conn: sqlite3.Connection) -> None:
+        # Index sessions per canvas, most recent first (list_sessions by canvas_id)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_canvas_updated ON chat_sessions(canvas_id, updated_at DESC, id DESC)
+        """)
+
+    def down(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DROP INDEX IF EXISTS idx_chat_sessions_canvas_updated")
@@ -1,74 +1,228 @@
 #!/usr/bin/env python3
 import os
-import base64
-from openai import OpenAI
-from dotenv import load_dotenv
+import binascii
+import hashlib
+import importlib.util
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
-# Load environment variables from .env file
-load_dotenv()
+# openai / dotenv are imported on first use to keep import (and CLI error
+# paths) cheap, but missing packages should still make this module unavailable
+for _module in ("openai", "dotenv"):
+    if importlib.util.find_spec(_module) is None:
+        raise ImportError(f"{_module} is required for text removal")
 
-# Initialize OpenAI client with API key from .env
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Text-removal instruction sent with every edit
+PROMPT = (
+    "Remove all visible text from this image and seamlessly inpaint the background. "
+    "Do not add or modify any objects. Keep the overall layout intact."
+)
+
+# Bump whenever PROMPT or the edit parameters change so older cached
+# results are not served for the new instruction
+PROMPT_VERSION = 1
+
+# Edited images are stored here keyed by a hash of the input bytes, so the
+# same image is only sent to the API once (including across restarts).
+# Defaults to the backend's user_data directory, independent of the cwd
+EDIT_CACHE_DIR = os.getenv("TEXT_REMOVAL_CACHE_DIR", os.path.join(
+    os.getenv("USER_DATA_DIR", os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "user_data")),
+    "text_removal_cache"))
+
+# Most cached edits kept on disk; the least recently used are deleted
+# once a new edit pushes the cache past this
+EDIT_CACHE_MAX_ENTRIES = int(os.getenv("TEXT_REMOVAL_CACHE_MAX_ENTRIES", "256"))
+
+# Bytes hashed per read and base64 characters decoded per write (a multiple
+# of 4, so every decoded slice is valid base64)
+IO_CHUNK_SIZE = 1 << 20
+
+# Concurrent edit requests issued by remove_text_batch;
+# keep this within the account's images RPM limit
+BATCH_MAX_WORKERS = 4
+
+# Attempts the OpenAI SDK retries on 408/409/429/5xx and connection errors,
+# with exponential backoff and jitter (0.5s doubling, capped at 8s)
+EDIT_MAX_RETRIES = 4
+
+_client = None
+_client_lock = threading.Lock()
+
+def _client_kwargs() -> dict:
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # Reuse the backend's pooled httpx client so edits share keep-alive
+    # connections with other API calls; fall back to the SDK default when
+    # run standalone outside the backend package root
+    try:
+        from utils.http_client import HttpClient
+        http_client = HttpClient.get_shared_sync_client()
+    except ImportError:
+        http_client = None
+
+    return {
+        "api_key": os.getenv('OPENAI_API_KEY'),
+        "http_client": http_client,
+        "max_retries": EDIT_MAX_RETRIES,
+    }
+
+def _get_client():
+    """OpenAI client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(**_client_kwargs())
+    return _client
 
 def remove_text(input_image_path: str) -> str:
     """Use OpenAI to remove text directly from the image"""
-    print("Processing image with OpenAI API...")
+    stem = os.path.splitext(os.path.basename(input_image_path))[0]
+    # Hash and upload straight from the file in chunks; the image is never
+    # held in memory as one bytes object on this path
+    with open(input_image_path, "rb") as f:
+        h = _new_hash()
+        for chunk in iter(lambda: f.read(IO_CHUNK_SIZE), b""):
+            h.update(chunk)
+        f.seek(0)
+        return _remove_text(f, stem, _cache_path(_finish_hash(h)))
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+def _finish_hash(h) -> str:
+    # Fold in the prompt version so edits from an older prompt are not reused
+    h.update(PROMPT_VERSION.to_bytes(4, "little"))
+    return h.hexdigest()
+
+def _cache_key(image_data: bytes) -> str:
+    """Content hash of the input image plus the prompt version"""
+    h = _new_hash()
+    h.update(image_data)
+    return _finish_hash(h)
+
+def _cache_path(key: str) -> str:
+    return os.path.join(EDIT_CACHE_DIR, f"edited_{key}.png")
+
+def _edit_params(image, stem: str) -> dict:
+    # image is raw bytes or an open binary file; either is sent as-is in
+    # the multipart body, with no temp file round-trip or re-encoding
+    return {
+        "model": "gpt-image-1",
+        "prompt": PROMPT,
+        "image": (f"{stem}.png", image, "image/png"),
+        "size": "1024x1024",
+        "quality": "low",
+    }
+
+def _save_edit(response, output_path: str) -> str:
+    """Write the edited image from an images.edit response to output_path"""
+    # Get the base64 image from response
+    if not response.data or not response.data[0].b64_json:
+        raise ValueError("No image data received from OpenAI API")
     
+    image_base64 = response.data[0].b64_json
+    
+    # Decode straight into the file in IO_CHUNK_SIZE slices instead of
+    # buffering the whole PNG.
+    # Write to a temp name first so concurrent callers never see a
+    # partial cache entry
+    os.makedirs(EDIT_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(image_base64), IO_CHUNK_SIZE):
+            f.write(binascii.a2b_base64(image_base64[start:start + IO_CHUNK_SIZE]))
+    os.replace(tmp_path, output_path)
+    
+    print(f"✓ Saved edited image to {output_path}")
+    _prune_cache()
+    return output_path
+
+def _prune_cache() -> None:
+    """Delete the least recently used edits beyond EDIT_CACHE_MAX_ENTRIES"""
     try:
-        # Define a detailed prompt for text removal
-        prompt = (
-            "Remove all visible text from this image and seamlessly inpaint the background. "
-            "Do not add or modify any objects. Keep the overall layout intact."
-        )
-        
-        response = client.images.edit(
-            model="gpt-image-1",
-            prompt=prompt,
-            image=open(input_image_path, "rb"),
-            size="1024x1024",
-            quality="low"
-        )
-        
-        # Get the base64 image from response
-        if not response.data or not response.data[0].b64_json:
-            raise ValueError("No image data received from OpenAI API")
-        
-        image_base64 = response.data[0].b64_json
-        
-        # Save the result
-        timestamp = os.path.splitext(os.path.basename(input_image_path))[0]
-        output_path = f"edited_{timestamp}.png"
-        
-        # Decode and save the image
-        image_bytes = base64.b64decode(image_base64)
-        with open(output_path, "wb") as f:
-            f.write(image_bytes)
-            
-        print(f"✓ Saved edited image to {output_path}")
+        entries = [entry for entry in os.scandir(EDIT_CACHE_DIR)
+                   if entry.name.startswith("edited_") and entry.name.endswith(".png")]
+    except FileNotFoundError:
+        return
+    if len(entries) <= EDIT_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - EDIT_CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+def _cached(output_path: str) -> bool:
+    """True when output_path holds a cached edit; refreshes its LRU position"""
+    try:
+        os.utime(output_path)
+    except FileNotFoundError:
+        return False
+    print(f"✓ Reusing cached edited image {output_path}")
+    return True
+
+def _remove_text(image, stem: str, output_path: str, use_cache: bool = True) -> str:
+    # use_cache=False always calls the API and replaces the cached entry,
+    # for callers that rejected the previously cached result
+    if use_cache and _cached(output_path):
         return output_path
+
+    print("Processing image with OpenAI API...")
+    
+    try:
+        response = _get_client().images.edit(**_edit_params(image, stem))
+        return _save_edit(response, output_path)
         
     except Exception as e:
         print(f"❌ Error calling OpenAI API: {str(e)}")
         raise
 
+def remove_text_bytes(image_data: bytes, stem: str, use_cache: bool = True) -> str:
+    """Remove text from in-memory PNG bytes, reusing a cached edit of identical bytes"""
+    return _remove_text(image_data, stem, _cache_path(_cache_key(image_data)), use_cache)
+
+def remove_text_batch(input_image_paths: List[str]) -> List[str]:
+    """Remove text from several images concurrently, preserving input order"""
+    # Duplicate paths would race to fill the same cache entry; edit each once
+    unique_paths = list(dict.fromkeys(input_image_paths))
+    if not unique_paths:
+        return []
+
+    workers = min(BATCH_MAX_WORKERS, len(unique_paths))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(unique_paths, pool.map(remove_text, unique_paths)))
+    return [results[path] for path in input_image_paths]
+
 def main() -> None:
-    # Use the specified image path
-    input_image = "gpt_image_20250608_152538_e02c5414.png"
+    # Use the image paths given on the command line, or the default image
+    input_images = sys.argv[1:] or ["gpt_image_20250608_152538_e02c5414.png"]
     
-    if not os.path.exists(input_image):
-        print(f"❌ Error: Image not found at {input_image}")
+    missing = [path for path in input_images if not os.path.exists(path)]
+    if missing:
+        for path in missing:
+            print(f"❌ Error: Image not found at {path}")
         return
         
     try:
-        # Remove text from the image
-        output_path = remove_text(input_image)
+        # Remove text from all images, several requests at a time
+        output_paths = remove_text_batch(input_images)
         
         print("\n✨ All done! Process completed successfully:")
-        print(f"Input image: {input_image}")
-        print(f"Final output: {output_path}")
+        for input_image, output_path in zip(input_images, output_paths):
+            print(f"Input image: {input_image}")
+            print(f"Final output: {output_path}")
         
     except Exception as e:
         print(f"\n❌ Process failed: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -20,16 +20,24 @@ Settings Service - 设置服务模块
 - app_settings: 全局设置缓存
 """
 
+import copy
 import os
 import traceback
 import json
+from types import MappingProxyType
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # 用户数据目录路径，优先使用环境变量，否则使用默认路径
 USER_DATA_DIR = os.getenv("USER_DATA_DIR", os.path.join(
     os.path.dirname(os.path.dirname(__file__)), "user_data"))
 
 # 全局设置配置缓存，用于在应用运行时快速访问设置
-app_settings = {}
+app_settings = MappingProxyType({})
 
 # 默认设置配置模板
 # 定义了应用程序的基础配置结构和默认值
@@ -39,6 +47,44 @@ DEFAULT_SETTINGS = {
     "enabled_knowledge_data": []  # 启用的知识库完整数据列表
 }
 
+# DEFAULT_SETTINGS 的只读视图，加载失败时返回给调用方，避免全局默认值被意外修改
+# MappingProxyType 只保护顶层，因此基于深拷贝构建，列表值不与 DEFAULT_SETTINGS 共享
+_DEFAULT_SETTINGS_VIEW = MappingProxyType(copy.deepcopy(DEFAULT_SETTINGS))
+
+# DEFAULT_SETTINGS 中值为字典、需要深度合并的键（目前没有）
+_NESTED_DEFAULT_KEYS = tuple(
+    key for key, value in DEFAULT_SETTINGS.items() if isinstance(value, dict))
+
+
+def _loads_settings(data):
+    """解析设置文件内容（bytes），优先使用 orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_settings(settings):
+    """将设置序列化为缩进 2 格的 JSON bytes，优先使用 orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(settings, option=orjson.OPT_INDENT_2)
+    return json.dumps(settings, indent=2).encode('utf-8')
+
+
+def _merge_with_defaults(settings):
+    """
+    将文件中的设置与默认设置合并，确保所有键都存在
+
+    先做一次扁平合并，再只对默认值为字典的键做深度合并，
+    不再对每个键逐一做类型检查。默认值先深拷贝，
+    合并结果中的列表等可变值不会与 DEFAULT_SETTINGS 共享。
+    """
+    merged_settings = {**copy.deepcopy(DEFAULT_SETTINGS), **settings}
+    for key in _NESTED_DEFAULT_KEYS:
+        value = settings.get(key)
+        if isinstance(value, dict):
+            merged_settings[key] = {**copy.deepcopy(DEFAULT_SETTINGS[key]), **value}
+    return merged_settings
+
 
 class SettingsService:
     """
@@ -63,6 +109,9 @@ class SettingsService:
             os.path.dirname(os.path.dirname(__file__)))
         self.settings_file = os.getenv(
             "SETTINGS_PATH", os.path.join(USER_DATA_DIR, "settings.json"))
+        # 已解析设置的缓存，以设置文件的 mtime 作为失效依据
+        self._cache = None
+        self._mtime = 0
 
     async def exists_settings(self):
         """
@@ -92,33 +141,14 @@ class SettingsService:
         Note:
             返回的设置适用于 API 响应，敏感信息（如密码）会被 '*' 掩码
         """
+        # 掩码尚未实现（当前设置中没有敏感字段），与 get_raw_settings 共用同一份加载结果；
+        # 深拷贝成普通 dict 供 API 序列化，调用方修改嵌套列表不会影响缓存
         try:
-            if not os.path.exists(self.settings_file):
-                # 如果设置文件不存在，创建默认设置文件
-                self.create_default_settings()
-
-            # 读取 JSON 配置文件
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-
-            # 与默认设置合并，确保所有键都存在
-            merged_settings = {**DEFAULT_SETTINGS}
-            for key, value in settings.items():
-                if key in merged_settings and isinstance(merged_settings[key], dict) and isinstance(value, dict):
-                    # 对于字典类型的设置，进行深度合并
-                    merged_settings[key].update(value)
-                else:
-                    # 其他类型直接覆盖
-                    merged_settings[key] = value
-
-            # 更新全局设置缓存（存储未掩码的完整版本）
-            global app_settings
-            app_settings = merged_settings
-            return merged_settings
+            return copy.deepcopy(dict(self._load()))
         except Exception as e:
             print(f"Error loading settings: {e}")
             traceback.print_exc()
-            return DEFAULT_SETTINGS
+            return copy.deepcopy(DEFAULT_SETTINGS)
 
     def get_raw_settings(self):
         """
@@ -130,35 +160,53 @@ class SettingsService:
         3. 设置的验证和处理
 
         Returns:
-            dict: 包含所有设置的完整字典，敏感信息未被掩码
+            Mapping: 包含所有设置的只读快照（MappingProxyType），敏感信息未被掩码；
+                只读仅限顶层，嵌套的列表与缓存共享，调用方不应修改
 
         Note:
             此方法返回的数据包含敏感信息，仅供内部使用，不应直接用于 API 响应
         """
         try:
-            if not os.path.exists(self.settings_file):
-                # 如果设置文件不存在，创建默认设置
-                self.create_default_settings()
-
-            # 读取 JSON 配置文件
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-
-            # 与默认设置合并
-            merged_settings = {**DEFAULT_SETTINGS}
-            for key, value in settings.items():
-                if key in merged_settings and isinstance(merged_settings[key], dict) and isinstance(value, dict):
-                    merged_settings[key].update(value)
-                else:
-                    merged_settings[key] = value
-
-            # 更新全局设置缓存
-            global app_settings
-            app_settings = merged_settings
-            return merged_settings
+            return self._load()
         except Exception as e:
             print(f"Error loading raw settings: {e}")
-            return DEFAULT_SETTINGS
+            return _DEFAULT_SETTINGS_VIEW
+
+    def _load(self):
+        """
+        读取设置文件并与默认设置合并（get_settings / get_raw_settings 共用）
+
+        文件 mtime 未变化时直接返回缓存；文件不存在时先创建默认设置。
+
+        Returns:
+            Mapping: 合并后的完整设置（只读快照）
+
+        Raises:
+            Exception: 读取或解析设置文件失败时抛出，由调用方处理
+        """
+        # 文件未被修改时直接返回缓存，只需一次 stat 调用
+        try:
+            mtime = os.stat(self.settings_file).st_mtime_ns
+        except FileNotFoundError:
+            # 如果设置文件不存在，创建默认设置
+            self.create_default_settings()
+            mtime = os.stat(self.settings_file).st_mtime_ns
+        if self._cache is not None and mtime == self._mtime:
+            return self._cache
+
+        # 读取 JSON 配置文件
+        with open(self.settings_file, 'rb') as f:
+            settings = _loads_settings(f.read())
+
+        # 与默认设置合并，确保所有键都存在；缓存为只读快照，调用方无法修改共享状态
+        merged_settings = MappingProxyType(_merge_with_defaults(settings))
+
+        # 更新全局设置缓存
+        global app_settings
+        app_settings = merged_settings
+        self._cache = merged_settings
+        self._mtime = mtime
+        return merged_settings
 
     def get_proxy_config(self):
         """
@@ -181,7 +229,8 @@ class SettingsService:
             list: 启用的知识库ID列表
         """
         settings = self.get_raw_settings()
-        return settings.get('enabled_knowledge', [])
+        # 返回副本，避免调用方修改缓存中的列表
+        return list(settings.get('enabled_knowledge', []))
 
     async def update_enabled_knowledge(self, knowledge_ids):
         """
@@ -203,7 +252,8 @@ class SettingsService:
             list: 知识库数据列表，每个项目包含name、description、content等信息
         """
         settings = self.get_raw_settings()
-        return settings.get('enabled_knowledge_data', [])
+        # 返回深拷贝，避免调用方修改缓存中的知识库数据
+        return copy.deepcopy(settings.get('enabled_knowledge_data', []))
 
     async def update_enabled_knowledge_data(self, knowledge_data_list):
         """
@@ -234,15 +284,26 @@ class SettingsService:
             Exception: 当文件创建失败时抛出异常
         """
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
-
             # 写入默认设置到 JSON 文件
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(DEFAULT_SETTINGS, f, indent=2)
+            self._write_settings(DEFAULT_SETTINGS)
         except Exception as e:
             print(f"Error creating default settings: {e}")
 
+    def _write_settings(self, settings):
+        """
+        原子地写入设置文件
+
+        先写入同目录下的临时文件，再用 os.replace 替换，
+        并发读取方不会读到被截断的文件。
+        """
+        # 确保目录存在
+        os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
+
+        tmp_file = self.settings_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(_dumps_settings(settings))
+        os.replace(tmp_file, self.settings_file)
+
     async def update_settings(self, data):
         """
         更新设置配置
@@ -268,13 +329,14 @@ class SettingsService:
         """
         try:
             # 加载现有设置，如果文件不存在则使用默认设置
-            existing_settings = DEFAULT_SETTINGS.copy()
-            if os.path.exists(self.settings_file):
-                try:
-                    with open(self.settings_file, 'r', encoding='utf-8') as f:
-                        existing_settings = json.load(f)
-                except Exception as e:
-                    print(f"Error reading existing settings: {e}")
+            existing_settings = copy.deepcopy(DEFAULT_SETTINGS)
+            try:
+                with open(self.settings_file, 'rb') as f:
+                    existing_settings = _loads_settings(f.read())
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error reading existing settings: {e}")
 
             # 合并新数据到现有设置
             for key, value in data.items():
@@ -285,16 +347,13 @@ class SettingsService:
                     # 其他类型直接覆盖
                     existing_settings[key] = value
 
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
-
             # 保存更新后的设置到文件
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_settings, f, indent=2)
+            self._write_settings(existing_settings)
 
-            # 更新全局设置缓存
+            # 更新全局设置缓存，并让下次读取重新解析文件
             global app_settings
-            app_settings = existing_settings
+            app_settings = MappingProxyType(existing_settings)
+            self._cache = None
 
             return {"status": "success", "message": "Settings updated successfully"}
         except Exception as e:
@@ -304,8 +363,5 @@ class SettingsService:
 
 # 创建全局设置服务实例
 # 整个应用程序使用这个单例实例来管理设置
+# 设置在首次调用 get_* 时才加载，导入本模块不会触发磁盘读取
 settings_service = SettingsService()
-
-# 在模块导入时初始化设置
-# 确保全局设置缓存在应用启动时就被加载
-settings_service.get_raw_settings()
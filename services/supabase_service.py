@@ -5,26 +5,81 @@ Handles all database operations using Supabase PostgreSQL
 
 import os
 import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import httpx
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 load_dotenv()
 
+# Keep-alive connections held by the PostgREST client; DatabaseService runs
+# Supabase calls in worker threads, so several can be in flight at once
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "50"))
+
+# Columns returned by list endpoints, matching the SQLite listings
+CANVAS_LIST_COLUMNS = "id,name,description,thumbnail,created_at,updated_at"
+SESSION_LIST_COLUMNS = "id,title,model,provider,created_at,updated_at"
+WORKFLOW_LIST_COLUMNS = "id,name,description,api_json,inputs,outputs,updated_at"
+
+# Tables whose row counts get_stats reports
+STATS_TABLES = ("canvases", "chat_sessions", "chat_messages", "comfy_workflows")
+
+# Seconds a fetched canvas / chat session / workflow row is served from memory;
+# writes through this service invalidate it immediately
+ROW_CACHE_TTL = float(os.getenv("SUPABASE_CACHE_TTL", "5"))
+ROW_CACHE_MAXSIZE = 2048
+
+# DatabaseLogger output is opt-in; set SUPABASE_DEBUG=1 to trace every call
+SUPABASE_DEBUG = os.getenv("SUPABASE_DEBUG", "0") == "1"
+
+
+def _dumps(value: Any) -> str:
+    """Pretty-print a logged value as JSON"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, indent=2)
+
+def _preview(text: str, limit: int = 100) -> str:
+    """Truncate text for log output; short text is returned as-is"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _returning(return_row: bool) -> str:
+    """PostgREST Prefer: return= mode; "minimal" skips sending the written rows back"""
+    return "representation" if return_row else "minimal"
+
+def _utcnow_iso() -> str:
+    """UTC timestamp for updated_at columns, with an explicit offset"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
 class DatabaseLogger:
     """Console logger for database operations"""
     
     @staticmethod
     def log_operation(operation: str, table: str, details: Dict[str, Any] = None):
         """Log database operation with details"""
+        if not SUPABASE_DEBUG:
+            return
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
         print(f"\n🗄️  SUPABASE [{timestamp}] {operation.upper()}")
         print(f"   📋 Table: {table}")
         if details:
             for key, value in details.items():
                 if isinstance(value, (dict, list)):
-                    print(f"   📊 {key}: {json.dumps(value, indent=2)}")
+                    print(f"   📊 {key}: {_dumps(value)}")
                 else:
                     print(f"   📊 {key}: {value}")
         print(f"   {'─' * 50}")
@@ -32,6 +87,8 @@ class DatabaseLogger:
     @staticmethod
     def log_result(success: bool, operation: str, result: Any = None, error: str = None):
         """Log operation result"""
+        if not SUPABASE_DEBUG:
+            return
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
         status = "✅ SUCCESS" if success else "❌ ERROR"
         print(f"🗄️  SUPABASE [{timestamp}] {operation.upper()} - {status}")
@@ -40,9 +97,9 @@ class DatabaseLogger:
             if isinstance(result, list):
                 print(f"   📈 Records: {len(result)}")
                 if result and isinstance(result[0], dict):
-                    print(f"   📋 Sample: {json.dumps(result[0], indent=2)}")
+                    print(f"   📋 Sample: {_dumps(result[0])}")
             elif isinstance(result, dict):
-                print(f"   📋 Result: {json.dumps(result, indent=2)}")
+                print(f"   📋 Result: {_dumps(result)}")
             else:
                 print(f"   📋 Result: {result}")
         elif error:
@@ -50,6 +107,11 @@ class DatabaseLogger:
         print(f"   {'─' * 50}\n")
 
 class SupabaseService:
+    # Columns each update_* method accepts from its keyword arguments
+    _UPDATABLE_CANVAS = frozenset({"name", "data", "description", "thumbnail"})
+    _UPDATABLE_SESSION = frozenset({"title", "model", "provider", "canvas_id"})
+    _UPDATABLE_WORKFLOW = frozenset({"name", "api_json", "description", "inputs", "outputs"})
+
     def __init__(self):
         """Initialize Supabase client"""
         self.supabase_url = os.getenv("SUPABASE_URL")
@@ -62,13 +124,113 @@ class SupabaseService:
         # Use service role key for backend operations (bypasses RLS)
         key_to_use = self.supabase_service_key if self.supabase_service_key else self.supabase_anon_key
         self.supabase: Client = create_client(self.supabase_url, key_to_use)
+        self._configure_pool()
+
+        # (table, id) -> {columns: (expires_at, row)}, least recently used first
+        self._row_cache: "OrderedDict[Tuple[str, Any], Dict[str, Tuple[float, Dict[str, Any]]]]" = OrderedDict()
+        self._row_cache_lock = threading.Lock()
+        # Bumped on every invalidation so reads racing a write don't cache stale rows
+        self._row_cache_epoch = 0
+
+    def _configure_pool(self):
+        """Swap the PostgREST session for one with a larger persistent keep-alive pool"""
+        try:
+            postgrest = self.supabase.postgrest
+            session = postgrest.session
+            pool_kwargs = dict(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=session.timeout,
+                follow_redirects=session.follow_redirects,
+                # httpx does not expose these on the client; postgrest keeps
+                # verify/proxy itself and always builds its session with HTTP/2
+                verify=getattr(postgrest, 'verify', True),
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_POOL_SIZE,
+                    max_keepalive_connections=SUPABASE_POOL_SIZE,
+                    keepalive_expiry=60.0
+                )
+            )
+            proxy = getattr(postgrest, 'proxy', None)
+            if proxy:
+                pool_kwargs['proxy'] = proxy
+            # Rebuild with postgrest's own session type so its extra methods
+            # (e.g. aclose on older postgrest-py SyncClient) keep working
+            postgrest.session = type(session)(**pool_kwargs)
+            session.close()
+        except (AttributeError, ImportError, TypeError) as e:
+            # Client layout or httpx options differ across versions; keep the default pool
+            print(f"⚠️ Could not configure Supabase connection pool: {e}")
+
+    def _execute(self, query, operation: str, table: str, details: Dict[str, Any] = None):
+        """Execute a PostgREST query, tracing it through DatabaseLogger when SUPABASE_DEBUG is set
+
+        operation is the result label, e.g. "CREATE CANVAS"; its first word is
+        logged as the operation. Errors propagate with their original traceback.
+        """
+        if not SUPABASE_DEBUG:
+            return query.execute()
+
+        DatabaseLogger.log_operation(operation.split(" ", 1)[0], table, details)
+        try:
+            result = query.execute()
+        except Exception as e:
+            DatabaseLogger.log_result(False, operation, error=str(e))
+            raise
+        DatabaseLogger.log_result(True, operation, result.data)
+        return result
+
+    def _get_row(self, table: str, row_id: Any, columns: str, fetch) -> Optional[Dict[str, Any]]:
+        """Return a row by id through the TTL cache; fetch() runs the query on a miss"""
+        key = (table, row_id)
+        with self._row_cache_lock:
+            hit = self._row_cache.get(key, {}).get(columns)
+            if hit is not None and hit[0] > time.monotonic():
+                self._row_cache.move_to_end(key)
+                return hit[1]
+            epoch = self._row_cache_epoch
+
+        row = fetch()
+        if row is None:
+            return None
+
+        with self._row_cache_lock:
+            if epoch == self._row_cache_epoch:
+                self._row_cache.setdefault(key, {})[columns] = (time.monotonic() + ROW_CACHE_TTL, row)
+                self._row_cache.move_to_end(key)
+                while len(self._row_cache) > ROW_CACHE_MAXSIZE:
+                    self._row_cache.popitem(last=False)
+        return row
+
+    def _invalidate_row(self, table: str, row_id: Any):
+        """Drop cached copies of a row after it was written or deleted"""
+        with self._row_cache_lock:
+            self._row_cache.pop((table, row_id), None)
+            self._row_cache_epoch += 1
+
+    @staticmethod
+    def _page(query, limit: int, offset: int, after: Optional[Tuple[str, Any]]):
+        """Order newest first and page by offset, or by keyset when after is given
+
+        after is the (updated_at, id) of the last row of the previous page; keyset
+        paging lets Postgres seek straight to the next page instead of scanning
+        and discarding offset rows.
+        """
+        query = query.order("updated_at", desc=True).order("id", desc=True)
+        if after is None:
+            return query.range(offset, offset + limit - 1)
+        updated_at, last_id = after
+        return query.or_(
+            f'updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",id.lt."{last_id}")'
+        ).limit(limit)
 
     # =============================================
     # CANVAS OPERATIONS
     # =============================================
     
-    def create_canvas(self, canvas_id: str, name: str, description: str = "", thumbnail: str = "") -> Dict[str, Any]:
-        """Create a new canvas"""
+    def create_canvas(self, canvas_id: str, name: str, description: str = "", thumbnail: str = "", return_row: bool = True) -> Optional[Dict[str, Any]]:
+        """Create a new canvas; with return_row=False the row is not sent back and None is returned"""
         canvas_data = {
             "id": canvas_id,
             "name": name,
@@ -77,71 +239,53 @@ class SupabaseService:
             "thumbnail": thumbnail
         }
         
-        DatabaseLogger.log_operation("CREATE", "canvases", {
-            "canvas_id": canvas_id,
-            "name": name,
-            "description": description,
-            "thumbnail": thumbnail[:50] + "..." if len(thumbnail) > 50 else thumbnail
-        })
-        
-        try:
-            result = self.supabase.table("canvases").insert(canvas_data).execute()
-            success_result = result.data[0] if result.data else None
-            DatabaseLogger.log_result(True, "CREATE CANVAS", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "CREATE CANVAS", error=str(e))
-            raise
+        result = self._execute(
+            self.supabase.table("canvases").insert(canvas_data, returning=_returning(return_row)),
+            "CREATE CANVAS", "canvases", {
+                "canvas_id": canvas_id,
+                "name": name,
+                "description": description,
+                "thumbnail": _preview(thumbnail, 50)
+            })
+        return result.data[0] if result.data else None
 
-    def get_canvas(self, canvas_id: str) -> Optional[Dict[str, Any]]:
-        """Get canvas by ID"""
-        DatabaseLogger.log_operation("GET", "canvases", {"canvas_id": canvas_id})
-        
-        try:
-            result = self.supabase.table("canvases").select("*").eq("id", canvas_id).execute()
-            success_result = result.data[0] if result.data else None
-            DatabaseLogger.log_result(True, "GET CANVAS", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "GET CANVAS", error=str(e))
-            raise
+    def get_canvas(self, canvas_id: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """Get canvas by ID, optionally fetching only some columns"""
+        def fetch():
+            result = self._execute(
+                self.supabase.table("canvases").select(columns).eq("id", canvas_id),
+                "GET CANVAS", "canvases", {"canvas_id": canvas_id})
+            return result.data[0] if result.data else None
+        return self._get_row("canvases", canvas_id, columns, fetch)
 
-    def update_canvas(self, canvas_id: str, **kwargs) -> Dict[str, Any]:
-        """Update canvas data"""
-        update_data = {k: v for k, v in kwargs.items() if k in ["name", "data", "description", "thumbnail"]}
-        update_data["updated_at"] = datetime.now().isoformat()
+    def update_canvas(self, canvas_id: str, return_row: bool = True, **kwargs) -> Optional[Dict[str, Any]]:
+        """Update canvas data; with return_row=False the row is not sent back and None is returned"""
+        update_data = {k: v for k, v in kwargs.items() if k in self._UPDATABLE_CANVAS}
+        update_data["updated_at"] = _utcnow_iso()
         
-        result = self.supabase.table("canvases").update(update_data).eq("id", canvas_id).execute()
+        result = self.supabase.table("canvases").update(update_data, returning=_returning(return_row)).eq("id", canvas_id).execute()
+        self._invalidate_row("canvases", canvas_id)
         return result.data[0] if result.data else None
 
-    def list_canvases(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """List all canvases"""
-        DatabaseLogger.log_operation("LIST", "canvases", {"limit": limit, "offset": offset})
-        
-        try:
-            result = self.supabase.table("canvases")\
-                .select("*")\
-                .order("updated_at", desc=True)\
-                .range(offset, offset + limit - 1)\
-                .execute()
-            success_result = result.data or []
-            DatabaseLogger.log_result(True, "LIST CANVASES", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "LIST CANVASES", error=str(e))
-            raise
+    def list_canvases(self, limit: int = 50, offset: int = 0, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """List all canvases; pass after=(updated_at, id) of the last row for the next page"""
+        # Omit the (potentially large) canvas data column from listings
+        query = self._page(self.supabase.table("canvases").select(CANVAS_LIST_COLUMNS), limit, offset, after)
+        result = self._execute(query, "LIST CANVASES", "canvases", {"limit": limit, "offset": offset})
+        return result.data or []
 
     def delete_canvas(self, canvas_id: str) -> bool:
         """Delete canvas and all associated data"""
         result = self.supabase.table("canvases").delete().eq("id", canvas_id).execute()
+        self._invalidate_row("canvases", canvas_id)
         return len(result.data) > 0
 
     # =============================================
     # CHAT SESSION OPERATIONS
     # =============================================
     
-    def create_chat_session(self, session_id: str, canvas_id: str, title: str = None, model: str = None, provider: str = None) -> Dict[str, Any]:
-        """Create a new chat session"""
+    def create_chat_session(self, session_id: str, canvas_id: str, title: str = None, model: str = None, provider: str = None, return_row: bool = True) -> Optional[Dict[str, Any]]:
+        """Create a new chat session; with return_row=False the row is not sent back and None is returned"""
         session_data = {
             "id": session_id,
             "canvas_id": canvas_id,
@@ -150,107 +294,100 @@ class SupabaseService:
             "provider": provider
         }
         
-        DatabaseLogger.log_operation("CREATE", "chat_sessions", {
-            "session_id": session_id,
-            "canvas_id": canvas_id,
-            "title": title,
-            "model": model,
-            "provider": provider
-        })
-        
-        try:
-            result = self.supabase.table("chat_sessions").insert(session_data).execute()
-            success_result = result.data[0] if result.data else None
-            DatabaseLogger.log_result(True, "CREATE CHAT SESSION", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "CREATE CHAT SESSION", error=str(e))
-            raise
-
-    def get_chat_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get chat session by ID"""
-        result = self.supabase.table("chat_sessions").select("*").eq("id", session_id).execute()
+        result = self._execute(
+            self.supabase.table("chat_sessions").insert(session_data, returning=_returning(return_row)),
+            "CREATE CHAT SESSION", "chat_sessions", session_data)
         return result.data[0] if result.data else None
 
+    def get_chat_session(self, session_id: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """Get chat session by ID, optionally fetching only some columns"""
+        def fetch():
+            result = self.supabase.table("chat_sessions").select(columns).eq("id", session_id).execute()
+            return result.data[0] if result.data else None
+        return self._get_row("chat_sessions", session_id, columns, fetch)
+
     def update_chat_session(self, session_id: str, **kwargs) -> Dict[str, Any]:
         """Update chat session"""
-        update_data = {k: v for k, v in kwargs.items() if k in ["title", "model", "provider", "canvas_id"]}
-        update_data["updated_at"] = datetime.now().isoformat()
+        update_data = {k: v for k, v in kwargs.items() if k in self._UPDATABLE_SESSION}
+        update_data["updated_at"] = _utcnow_iso()
         
         result = self.supabase.table("chat_sessions").update(update_data).eq("id", session_id).execute()
+        self._invalidate_row("chat_sessions", session_id)
         return result.data[0] if result.data else None
 
-    def list_chat_sessions(self, canvas_id: str = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """List chat sessions, optionally filtered by canvas"""
-        query = self.supabase.table("chat_sessions").select("*")
+    def list_chat_sessions(self, canvas_id: str = None, limit: int = 50, offset: int = 0, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """List chat sessions, optionally filtered by canvas; after=(updated_at, id) pages by keyset"""
+        query = self.supabase.table("chat_sessions").select(SESSION_LIST_COLUMNS)
         
         if canvas_id:
             query = query.eq("canvas_id", canvas_id)
         
-        result = query.order("updated_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
+        result = self._page(query, limit, offset, after).execute()
         return result.data or []
 
     def delete_chat_session(self, session_id: str) -> bool:
         """Delete chat session and all messages"""
         result = self.supabase.table("chat_sessions").delete().eq("id", session_id).execute()
+        self._invalidate_row("chat_sessions", session_id)
         return len(result.data) > 0
 
     # =============================================
     # CHAT MESSAGE OPERATIONS
     # =============================================
     
-    def create_chat_message(self, session_id: str, role: str, message: str, metadata: Dict = None) -> Dict[str, Any]:
-        """Create a new chat message"""
+    def create_chat_message(self, session_id: str, role: str, message: str, metadata: Dict = None, return_row: bool = True) -> Optional[Dict[str, Any]]:
+        """Create a new chat message; with return_row=False the row is not sent back and None is returned"""
         message_data = {
             "session_id": session_id,
             "role": role,
             "message": message
         }
         
-        DatabaseLogger.log_operation("CREATE", "chat_messages", {
-            "session_id": session_id,
-            "role": role,
-            "message_preview": message[:100] + "..." if len(message) > 100 else message
-        })
-        
-        try:
-            result = self.supabase.table("chat_messages").insert(message_data).execute()
-            success_result = result.data[0] if result.data else None
-            DatabaseLogger.log_result(True, "CREATE CHAT MESSAGE", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "CREATE CHAT MESSAGE", error=str(e))
-            raise
+        result = self._execute(
+            self.supabase.table("chat_messages").insert(message_data, returning=_returning(return_row)),
+            "CREATE CHAT MESSAGE", "chat_messages", {
+                "session_id": session_id,
+                "role": role,
+                "message_preview": _preview(message)
+            })
+        return result.data[0] if result.data else None
+
+    def create_chat_messages(self, rows: List[Tuple[str, str, str]], return_row: bool = True) -> List[Dict[str, Any]]:
+        """Insert (session_id, role, message) rows, possibly spanning sessions, in one request
+
+        Rows are sent as one JSON array, so they are inserted (and assigned ids)
+        in list order. With return_row=False the rows are not sent back and an
+        empty list is returned.
+        """
+        message_data = [
+            {"session_id": session_id, "role": role, "message": message}
+            for session_id, role, message in rows
+        ]
 
-    def get_chat_messages(self, session_id: str, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """Get messages for a chat session"""
-        DatabaseLogger.log_operation("GET", "chat_messages", {
+        result = self._execute(
+            self.supabase.table("chat_messages").insert(message_data, returning=_returning(return_row)),
+            "CREATE CHAT MESSAGES", "chat_messages", {"count": len(message_data)})
+        return result.data or []
+
+    def get_chat_messages(self, session_id: str, limit: int = 100, offset: int = 0, columns: str = "*") -> List[Dict[str, Any]]:
+        """Get messages for a chat session, optionally fetching only some columns"""
+        query = self.supabase.table("chat_messages")\
+            .select(columns)\
+            .eq("session_id", session_id)\
+            .order("created_at", desc=False)\
+            .range(offset, offset + limit - 1)
+        result = self._execute(query, "GET CHAT MESSAGES", "chat_messages", {
             "session_id": session_id,
             "limit": limit,
             "offset": offset
         })
-        
-        try:
-            result = self.supabase.table("chat_messages")\
-                .select("*")\
-                .eq("session_id", session_id)\
-                .order("created_at", desc=False)\
-                .range(offset, offset + limit - 1)\
-                .execute()
-            success_result = result.data or []
-            DatabaseLogger.log_result(True, "GET CHAT MESSAGES", success_result)
-            return success_result
-        except Exception as e:
-            DatabaseLogger.log_result(False, "GET CHAT MESSAGES", error=str(e))
-            raise
+        return result.data or []
 
     def update_chat_message(self, message_id: int, message: str, metadata: Dict = None) -> Dict[str, Any]:
         """Update a chat message"""
         update_data = {
             "message": message,
-            "updated_at": datetime.now().isoformat()
+            "updated_at": _utcnow_iso()
         }
         
         result = self.supabase.table("chat_messages").update(update_data).eq("id", message_id).execute()
@@ -265,8 +402,8 @@ class SupabaseService:
     # COMFY WORKFLOW OPERATIONS
     # =============================================
     
-    def create_comfy_workflow(self, name: str, api_json: str = None, description: str = "", inputs: str = None, outputs: str = None) -> Dict[str, Any]:
-        """Create a new ComfyUI workflow"""
+    def create_comfy_workflow(self, name: str, api_json: str = None, description: str = "", inputs: str = None, outputs: str = None, return_row: bool = True) -> Optional[Dict[str, Any]]:
+        """Create a new ComfyUI workflow; with return_row=False the row is not sent back and None is returned"""
         workflow_data = {
             "name": name,
             "api_json": api_json,
@@ -275,34 +412,35 @@ class SupabaseService:
             "outputs": outputs
         }
         
-        result = self.supabase.table("comfy_workflows").insert(workflow_data).execute()
+        result = self.supabase.table("comfy_workflows").insert(workflow_data, returning=_returning(return_row)).execute()
         return result.data[0] if result.data else None
 
-    def get_comfy_workflow(self, workflow_id: int) -> Optional[Dict[str, Any]]:
-        """Get ComfyUI workflow by ID"""
-        result = self.supabase.table("comfy_workflows").select("*").eq("id", workflow_id).execute()
-        return result.data[0] if result.data else None
+    def get_comfy_workflow(self, workflow_id: int, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """Get ComfyUI workflow by ID, optionally fetching only some columns"""
+        def fetch():
+            result = self.supabase.table("comfy_workflows").select(columns).eq("id", workflow_id).execute()
+            return result.data[0] if result.data else None
+        return self._get_row("comfy_workflows", workflow_id, columns, fetch)
 
-    def list_comfy_workflows(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """List all ComfyUI workflows"""
-        result = self.supabase.table("comfy_workflows")\
-            .select("*")\
-            .order("updated_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
+    def list_comfy_workflows(self, limit: int = 50, offset: int = 0, columns: str = WORKFLOW_LIST_COLUMNS,
+                             after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """List all ComfyUI workflows; after=(updated_at, id) pages by keyset"""
+        result = self._page(self.supabase.table("comfy_workflows").select(columns), limit, offset, after).execute()
         return result.data or []
 
     def update_comfy_workflow(self, workflow_id: int, **kwargs) -> Dict[str, Any]:
         """Update ComfyUI workflow"""
-        update_data = {k: v for k, v in kwargs.items() if k in ["name", "api_json", "description", "inputs", "outputs"]}
-        update_data["updated_at"] = datetime.now().isoformat()
+        update_data = {k: v for k, v in kwargs.items() if k in self._UPDATABLE_WORKFLOW}
+        update_data["updated_at"] = _utcnow_iso()
         
         result = self.supabase.table("comfy_workflows").update(update_data).eq("id", workflow_id).execute()
+        self._invalidate_row("comfy_workflows", workflow_id)
         return result.data[0] if result.data else None
 
     def delete_comfy_workflow(self, workflow_id: int) -> bool:
         """Delete ComfyUI workflow"""
         result = self.supabase.table("comfy_workflows").delete().eq("id", workflow_id).execute()
+        self._invalidate_row("comfy_workflows", workflow_id)
         return len(result.data) > 0
 
     # =============================================
@@ -328,19 +466,19 @@ class SupabaseService:
                 "error": str(e)
             }
 
+    def _count(self, table: str) -> int:
+        """Row count computed by Postgres; a HEAD request returns no rows"""
+        return self.supabase.table(table).select("id", count="exact", head=True).execute().count or 0
+
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
         try:
-            canvases_count = len(self.supabase.table("canvases").select("id").execute().data)
-            sessions_count = len(self.supabase.table("chat_sessions").select("id").execute().data)
-            messages_count = len(self.supabase.table("chat_messages").select("id").execute().data)
-            workflows_count = len(self.supabase.table("comfy_workflows").select("id").execute().data)
+            # Issue the count requests concurrently instead of one after another
+            with ThreadPoolExecutor(max_workers=len(STATS_TABLES)) as pool:
+                counts = dict(zip(STATS_TABLES, pool.map(self._count, STATS_TABLES)))
             
             return {
-                "canvases": canvases_count,
-                "chat_sessions": sessions_count,
-                "chat_messages": messages_count,
-                "comfy_workflows": workflows_count,
+                **counts,
                 "database": "supabase",
                 "timestamp": datetime.now().isoformat()
             }
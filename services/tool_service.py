@@ -1,5 +1,5 @@
 import traceback
-from typing import Dict
+from typing import Dict, List, Sequence
 from langchain_core.tools import BaseTool
 from models.tool_model import ToolInfo
 from tools.comfy_dynamic import build_tool
@@ -171,6 +171,8 @@ TOOL_MAPPING: Dict[str, ToolInfo] = {
 class ToolService:
     def __init__(self):
         self.tools: Dict[str, ToolInfo] = {}
+        # 每次工具注册表变化时递增，供依赖工具的缓存判断是否失效
+        self.version = 0
         self._register_required_tools()
 
     def _register_required_tools(self):
@@ -190,6 +192,7 @@ class ToolService:
             return
 
         self.tools[tool_id] = tool_info
+        self.version += 1
 
     # TODO: Check if there will be racing conditions when server just starting up but tools are not ready yet.
     async def initialize(self):
@@ -212,14 +215,24 @@ class ToolService:
         tool_info = self.tools.get(tool_name)
         return tool_info.get('tool_function') if tool_info else None
 
+    def get_tools_bulk(self, tool_names: Sequence[str]) -> List[BaseTool]:
+        """批量获取工具，跳过未注册的工具"""
+        tools = self.tools
+        return [
+            tool_info['tool_function'] for tool_info in (tools.get(name) for name in tool_names)
+            if tool_info and tool_info.get('tool_function')
+        ]
+
     def remove_tool(self, tool_id: str):
         self.tools.pop(tool_id)
+        self.version += 1
 
     def get_all_tools(self) -> Dict[str, ToolInfo]:
         return self.tools.copy()
 
     def clear_tools(self):
         self.tools.clear()
+        self.version += 1
         # 重新注册必须的工具
         self._register_required_tools()
 
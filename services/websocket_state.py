@@ -1,10 +1,34 @@
 # services/websocket_state.py
+import json
 import socketio
 from typing import Dict
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class _OrjsonCodec:
+    """json-compatible codec for socket.io packets backed by orjson"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            return json.dumps(obj, *args, **kwargs)
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
 sio = socketio.AsyncServer(
     cors_allowed_origins="*",
-    async_mode='asgi'
+    async_mode='asgi',
+    json=_OrjsonCodec if ORJSON_AVAILABLE else json
 )
 
 active_connections: Dict[str, dict] = {}
@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+
+class FakeSwarm:
+    """Replays a single root on_chain_end event, as astream_events v2 does at the end of a turn."""
+
+    def __init__(self, new_messages):
+        self.new_messages = new_messages
+
+    async def astream_events(self, inputs, config=None, version=None):
+        history = [
+            HumanMessage(content=m["content"]) if m["role"] == "user"
+            else AIMessage(content=m["content"], name=m.get("name"))
+            for m in inputs["messages"]
+        ]
+        yield {
+            "event": "on_chain_end",
+            "parent_ids": [],
+            "data": {"output": {"messages": history + self.new_messages}},
+        }
+
+
+class FakeDbService:
+    def __init__(self):
+        self.saved = []
+
+    async def enqueue_messages(self, session_id, rows):
+        self.saved.extend(rows)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def modules():
+    from services.langgraph_service.StreamProcessor import StreamProcessor
+    from services.langgraph_service.agent_manager import AgentManager
+    return StreamProcessor, AgentManager
+
+
+async def _run_turn(StreamProcessor, AgentManager, session_id, history, new_messages):
+    """Mirrors agent_service: process one turn, then remember the last active agent."""
+    sent = []
+
+    async def send(_session_id, event):
+        sent.append(event)
+
+    processor = StreamProcessor(session_id, FakeDbService(), send)
+    await processor.process_stream(FakeSwarm(new_messages), history, {})
+    if processor.last_active_agent:
+        AgentManager.remember_last_active_agent(session_id, processor.last_active_agent)
+    return processor, sent
+
+
+def test_last_active_agent_follows_handoff_across_turns(modules):
+    StreamProcessor, AgentManager = modules
+    agent_names = ["planner", "image_designer"]
+    session_id = f"test-{uuid.uuid4()}"
+
+    async def scenario():
+        history = [{"role": "user", "content": "draw a cat"}]
+        processor, sent = await _run_turn(StreamProcessor, AgentManager, session_id, history, [
+            AIMessage(content="plan ready", name="planner"),
+        ])
+        assert sent[0]["type"] == "all_messages"
+        assert processor.last_active_agent == "planner"
+        assert AgentManager.get_last_active_agent(history, agent_names, session_id) == "planner"
+
+        history = history + [
+            {"role": "assistant", "content": "plan ready", "name": "planner"},
+            {"role": "user", "content": "go ahead"},
+        ]
+        processor, _ = await _run_turn(StreamProcessor, AgentManager, session_id, history, [
+            AIMessage(
+                content="",
+                name="planner",
+                tool_calls=[{"name": "transfer_to_image_designer", "args": {}, "id": "call_1"}],
+            ),
+            ToolMessage(content="transferred", tool_call_id="call_1", name="transfer_to_image_designer"),
+            AIMessage(content="here is your cat", name="image_designer"),
+        ])
+        assert processor.last_active_agent == "image_designer"
+        assert AgentManager.get_last_active_agent(history, agent_names, session_id) == "image_designer"
+
+    asyncio.run(scenario())
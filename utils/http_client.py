@@ -21,8 +21,12 @@ HTTP 客户端工厂和管理器
 3. 同步请求：使用 HttpClient.create_sync()
    with HttpClient.create_sync() as client:
        response = client.get("https://api.example.com/data")
+
+4. 进程级共享客户端：使用 HttpClient.get_shared_async_client() / get_shared_sync_client()
+   复用 keep-alive 连接，避免每次请求重新建立 TLS 握手，不要手动关闭
 """
 import ssl
+import threading
 import certifi
 import httpx
 from typing import Optional, Dict, Any, AsyncGenerator, Generator
@@ -36,6 +40,9 @@ class HttpClient:
     """HTTP 客户端工厂和管理器"""
 
     _ssl_context: Optional[ssl.SSLContext] = None
+    _shared_sync_client: Optional[httpx.Client] = None
+    _shared_async_client: Optional[httpx.AsyncClient] = None
+    _shared_lock = threading.Lock()
 
     @classmethod
     def _get_ssl_context(cls) -> ssl.SSLContext:
@@ -110,3 +117,23 @@ class HttpClient:
         """直接创建同步客户端（需要手动关闭）"""
         config = cls._get_client_config(**kwargs)
         return httpx.Client(**config)
+
+    # ========== 共享客户端 ==========
+
+    @classmethod
+    def get_shared_sync_client(cls) -> httpx.Client:
+        """获取进程级共享的同步客户端（延迟创建，不要手动关闭）"""
+        if cls._shared_sync_client is None:
+            with cls._shared_lock:
+                if cls._shared_sync_client is None:
+                    cls._shared_sync_client = cls.create_sync_client()
+        return cls._shared_sync_client
+
+    @classmethod
+    def get_shared_async_client(cls) -> httpx.AsyncClient:
+        """获取进程级共享的异步客户端（延迟创建，不要手动关闭）"""
+        if cls._shared_async_client is None:
+            with cls._shared_lock:
+                if cls._shared_async_client is None:
+                    cls._shared_async_client = cls.create_async_client()
+        return cls._shared_async_client